@@ -16,18 +16,23 @@ class Color_Transformer():
         value: specifies intensity of augmentation
         channel: specifies scoped channels for augmentation. can be r, g, b and any combination of them.
         is_value_percentage: indicates wether value is to be used as absolute value or percentage value
+        preserve_dtype: keeps the dtype of the input image. Percentage values are applied with
+                        saturating float64 arithmetic in blocks of rows instead of converting
+                        the whole image to float64 and returning int64
     '''
 
-    def __init__(self, method:str='keep', value:int=10, channel:str='rgb', is_value_percentage:bool=False) -> None:
+    def __init__(self, method:str='keep', value:int=10, channel:str='rgb', is_value_percentage:bool=False, preserve_dtype:bool=False) -> None:
 
         # constants
         self.METHODS = ['min', 'max', 'kill', 'keep', 'inc', 'dec']
+        self.BLOCK_ROWS = 256
 
         # variables
         self.set_method(method)
         self.set_value(value)
         self.set_channel(channel)
         self.set_is_value_percentage(is_value_percentage)
+        self.set_preserve_dtype(preserve_dtype)
 
 
     def __repr__(self) -> str:
@@ -75,6 +80,10 @@ class Color_Transformer():
         self.is_value_percentage = is_value_percentage
 
 
+    def set_preserve_dtype(self, preserve_dtype:bool) -> None:
+        self.preserve_dtype = preserve_dtype
+
+
     def __get_channel_encoding(self) -> list:
         '''
         Resolves channel variable to numpy indices.
@@ -189,13 +198,37 @@ class Color_Transformer():
         return img
 
 
-    def augment(self, img:np.ndarray) -> np.ndarray:
+    def __scale(self, img:np.ndarray, numeric_channel:list) -> np.ndarray:
         '''
-        Contoller for augmentation of the given image.
+        Increases or decreases pixel values of specified channels in place by a percentage,
+        saturating at 0 and 255.
+        Works on blocks of rows in float64 with the arithmetic of the masked pixel
+        operations, so the results are equal while the temporary memory stays small.
         params:
-            img: Image to be augmented
+            img: Image to modify
+            numeric_channel: List of channel indexes to modify
         '''
+        percent_val = self.value / 100
+        for start in range(0, img.shape[0], self.BLOCK_ROWS):
+            rows = img[start:start + self.BLOCK_ROWS]
+            for chan in numeric_channel:
+                block = rows[:, :, chan].astype(np.float64)
+                if self.method == 'inc':
+                    block += block * percent_val
+                else:
+                    block -= block * percent_val
+                np.clip(block, 0, 255, out=block)
+                # the assignment truncates like the conversion to int64
+                rows[:, :, chan] = block
+        return img
+
 
+    def __transform(self, img:np.ndarray) -> np.ndarray:
+        '''
+        Applies the transformation with the masked pixel operations.
+        params:
+            img: Image to be augmented
+        '''
         numeric_channel = self.__get_channel_encoding()
 
         if self.method == 'kill':
@@ -216,4 +249,142 @@ class Color_Transformer():
         elif self.method == 'dec':
             img = self.__dec(img, numeric_channel)
 
-        return img
\ No newline at end of file
+        return img
+
+
+    def __transform_lean(self, img:np.ndarray, out:np.ndarray) -> np.ndarray:
+        '''
+        Applies the transformation without changing the dtype of the image.
+        params:
+            img: Image to be augmented
+            out: Buffer of the same shape and dtype as img to write the result into. May be img itself.
+        '''
+        if self.__uses_lut(img):
+            return self.apply_lut(img, self.compile_lut(), out, self.BLOCK_ROWS)
+
+        if out is not img:
+            np.copyto(out, img)
+
+        if self.is_value_percentage and self.method in ['inc', 'dec']:
+            return self.__scale(out, self.__get_channel_encoding())
+
+        # all other methods already work in place
+        return self.__transform(out)
+
+
+    def __uses_lut(self, img:np.ndarray) -> bool:
+        '''
+        Checks if the image is transformed with the lookup table.
+        kill and keep only write channel slices, which is faster than any gather.
+        params:
+            img: Image to be augmented
+        '''
+        return self.method not in ['kill', 'keep'] and img.dtype == np.uint8 and img.ndim == 3 and img.shape[2] == 3
+
+
+    def compile_lut(self) -> np.ndarray:
+        '''
+        Compiles the transformation into a lookup table of shape (3, 256).
+        Entry [c, v] is the transformed value v of channel c (r, g, b) of an uint8 image.
+        '''
+        values = np.arange(256, dtype=np.float64)
+        lut = np.tile(values, (3, 1))
+        numeric_channel = self.__get_channel_encoding()
+
+        if self.method == 'kill':
+            lut[numeric_channel] = 0
+
+        elif self.method == 'keep':
+            lut[[chan for chan in range(3) if not chan in numeric_channel]] = 0
+
+        elif self.method == 'min':
+            lut[numeric_channel] = np.maximum(values, self.value)
+
+        elif self.method == 'max':
+            lut[numeric_channel] = np.minimum(values, self.value)
+
+        elif self.method == 'inc':
+            if self.is_value_percentage:
+                lut[numeric_channel] = values + values * (self.value / 100)
+            else:
+                lut[numeric_channel] = values + self.value
+
+        elif self.method == 'dec':
+            if self.is_value_percentage:
+                lut[numeric_channel] = values - values * (self.value / 100)
+            else:
+                lut[numeric_channel] = values - self.value
+
+        # saturate and truncate like the masked pixel operations
+        return np.clip(lut, 0, 255).astype(np.uint8)
+
+
+    @staticmethod
+    def fuse(transformers:list) -> np.ndarray:
+        '''
+        Fuses the lookup tables of a chain of Color_Transformers into a single table.
+        Applying the fused table equals applying the transformers one after another.
+        params:
+            transformers: Color_Transformers in order of application
+        '''
+        lut = np.tile(np.arange(256, dtype=np.uint8), (3, 1))
+        for transformer in transformers:
+            lut = np.take_along_axis(transformer.compile_lut(), lut.astype(np.intp), axis=1)
+        return lut
+
+
+    @staticmethod
+    def apply_lut(img:np.ndarray, lut:np.ndarray, out:np.ndarray=None, block_rows:int=256) -> np.ndarray:
+        '''
+        Transforms an uint8 RGB image with a lookup table.
+        Every channel is gathered from its own table with np.take in blocks of rows,
+        which keeps the intp index temporaries small. Channels with an identity
+        table are only copied.
+        params:
+            img: Image of shape (H, W, 3) with dtype uint8
+            lut: Lookup table of shape (3, 256)
+            out: Optional uint8 buffer of the shape of img. May be img itself.
+            block_rows: Number of rows gathered at once
+        '''
+        if out is None:
+            out = np.empty_like(img)
+        identity = np.arange(256, dtype=lut.dtype)
+
+        for chan in range(3):
+            if np.array_equal(lut[chan], identity):
+                if out is not img:
+                    out[:, :, chan] = img[:, :, chan]
+                continue
+            for start in range(0, img.shape[0], block_rows):
+                rows = slice(start, start + block_rows)
+                np.take(lut[chan], img[rows, :, chan], out=out[rows, :, chan])
+        return out
+
+
+    def augment(self, img:np.ndarray, out:np.ndarray=None) -> np.ndarray:
+        '''
+        Contoller for augmentation of the given image.
+        uint8 RGB images are transformed with the compiled lookup table,
+        except for kill and keep, which zero channels in place.
+        params:
+            img: Image to be augmented
+            out: Optional buffer of the shape of img to write the result into.
+                 With preserve_dtype, out=img transforms the image in place.
+        '''
+        if self.preserve_dtype:
+            if out is None:
+                out = np.empty_like(img)
+            return self.__transform_lean(img, out)
+
+        if self.__uses_lut(img):
+            img = self.apply_lut(img, self.compile_lut(), block_rows=self.BLOCK_ROWS)
+            # percentage values used to be returned as int64
+            if self.is_value_percentage and self.method in ['inc', 'dec']:
+                img = img.astype(np.int64)
+        else:
+            img = self.__transform(img)
+
+        if out is not None:
+            out[...] = img
+            return out
+        return img
@@ -0,0 +1,164 @@
+import numpy as np
+
+from augmentator import resampling
+from augmentator.lru_cache import LRUCache
+
+
+class Composer():
+    '''
+    Applies a chain of augmenters to images.
+    Consecutive geometric augmenters (Flipper, Translator, Cropper, Rotator and any
+    other augmenter with a get_transform method) are fused: their affine matrices are
+    multiplied and the image is resampled only once per run of geometric augmenters,
+    so the cost does not grow with the number of geometric steps.
+    All other augmenters are applied as usual with their augment method.
+    Pixels that a step moves off its canvas stay lost, like in the unfused chain,
+    and pixels mapped outside of the source are filled with fill_value.
+
+    params:
+        augmenters: augmenters in order of application
+        interpolation: interpolation of the fused resampling. nearest or bilinear.
+        fill_value: value of pixels mapped outside of the image
+        cache_size: number of fused index maps kept in a LRU cache. Maps are keyed by
+            the shapes and matrices of all steps. 0 disables caching.
+    '''
+    def __init__(self, augmenters:list, interpolation:str='bilinear', fill_value:int=255, cache_size:int=8) -> None:
+        self.cache = LRUCache(cache_size)
+        self.set_augmenters(augmenters)
+        self.set_interpolation(interpolation)
+        self.fill_value = fill_value
+
+
+    def __repr__(self) -> str:
+        return f'Composing {len(self.augmenters)} augmenters with {self.interpolation} interpolation.'
+
+
+    def set_augmenters(self, augmenters:list) -> None:
+        # verify type
+        if not all(hasattr(augmenter, 'augment') for augmenter in augmenters):
+            raise ValueError('Can not set augmenters: Every augmenter needs an augment method.')
+        else:
+            self.augmenters = list(augmenters)
+
+
+    def set_interpolation(self, interpolation:str) -> None:
+        if interpolation in resampling.INTERPOLATIONS:
+            self.interpolation = interpolation
+        else:
+            self.interpolation = 'bilinear'
+            print('Invalid interpolation entered.')
+            print(f'Interpolation set to default: {self.interpolation}')
+
+
+    def set_cache_size(self, cache_size:int) -> None:
+        self.cache.set_maxsize(cache_size)
+
+
+    def __get_stages(self) -> list:
+        '''
+        Splits the augmenters into stages. Geometric stages are lists of
+        consecutive geometric augmenters, all other augmenters are stages of their own.
+        '''
+        stages = []
+        for augmenter in self.augmenters:
+            if hasattr(augmenter, 'get_transform'):
+                if stages and isinstance(stages[-1], list):
+                    stages[-1].append(augmenter)
+                else:
+                    stages.append([augmenter])
+            else:
+                stages.append(augmenter)
+        return stages
+
+
+    def __get_outside(self, out_shape:tuple, matrix:np.ndarray, shape:tuple) -> np.ndarray:
+        '''
+        Returns a mask of output pixels that are mapped off an intermediate canvas, or None
+        if all pixels stay on it. An affine map keeps the output grid a parallelogram,
+        so the full mask is only computed if one of its corners leaves the canvas.
+        params:
+            out_shape: Shape (H, W) of the output grid
+            matrix: Matrix mapping the output grid onto the canvas
+            shape: Shape (H, W) of the canvas
+        '''
+        corners = np.array([[0, 0, out_shape[1] - 1, out_shape[1] - 1],
+                            [0, out_shape[0] - 1, 0, out_shape[0] - 1],
+                            [1, 1, 1, 1]])
+        x, y, _ = matrix @ corners
+        if x.min() >= -0.5 and x.max() <= shape[1] - 0.5 and y.min() >= -0.5 and y.max() <= shape[0] - 0.5:
+            return None
+
+        y, x = resampling.source_coordinates(out_shape, matrix)
+        return (y < -0.5) | (y > shape[0] - 0.5) | (x < -0.5) | (x > shape[1] - 0.5)
+
+
+    def __compute_index_map(self, shape:tuple, matrices:list, shapes:list) -> tuple:
+        '''
+        Computes the source indices of the fused transformation.
+            1. multiply the matrices, starting at the output.
+            2. send pixels that leave an intermediate canvas to the fill border.
+            3. map the output grid onto the source with the full product.
+        params:
+            shape: Shape of the source image
+            matrices: Matrix of every step
+            shapes: Shape (H, W) of the source and of the output of every step
+        '''
+        out_shape = shapes[-1]
+        product = np.eye(3)
+        outside = None
+
+        # intermediate canvases clip like the unfused chain
+        for step in range(len(matrices) - 1, -1, -1):
+            product = matrices[step] @ product
+            if step > 0:
+                mask = self.__get_outside(out_shape, product, shapes[step])
+                if mask is not None:
+                    outside = mask if outside is None else outside | mask
+
+        src_y, src_x = resampling.source_coordinates(out_shape, product)
+        if outside is not None:
+            src_y = np.where(outside, -2, src_y)
+
+        indices = resampling.index_map(src_y, src_x, shape, self.interpolation)
+        for array in indices:
+            if array is not None:
+                array.flags.writeable = False
+        return indices
+
+
+    def __warp(self, img:np.ndarray, augmenters:list) -> np.ndarray:
+        '''
+        Applies geometric augmenters in a single resampling pass.
+        Index maps are looked up in the cache and only computed on a miss.
+        params:
+            img: Image to be augmented
+            augmenters: geometric augmenters in order of application
+        '''
+        shapes = [img.shape[:2]]
+        matrices = []
+        for augmenter in augmenters:
+            matrix, out_shape = augmenter.get_transform(shapes[-1] + img.shape[2:])
+            matrices.append(matrix)
+            shapes.append(tuple(out_shape))
+
+        key = (tuple(shapes), tuple(matrix.tobytes() for matrix in matrices), self.interpolation)
+        indices = self.cache.get(key)
+        if indices is None:
+            indices = self.__compute_index_map(img.shape, matrices, shapes)
+            self.cache.put(key, indices)
+        return resampling.gather(img, indices, self.fill_value)
+
+
+    def augment(self, img:np.ndarray) -> np.ndarray:
+        '''
+        Takes an image in np.ndarray type as input.
+        Returns the image augmented by all augmenters in np.ndarray type.
+        params:
+            img: Image to be augmented
+        '''
+        for stage in self.__get_stages():
+            if isinstance(stage, list):
+                img = self.__warp(img, stage)
+            else:
+                img = stage.augment(img)
+        return img
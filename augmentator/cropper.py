@@ -1,7 +1,8 @@
 import numpy as np
-import random
 
-class Cropper():
+from augmentator import resampling, seeding
+
+class Cropper(seeding.Randomized):
     ''' 
     Class to crop images.
     Cropping can be centered or in a random position.
@@ -12,12 +13,20 @@ class Cropper():
             valid values are center or random.
         value: set intensity of cropping.
             IMPORTANT: values >= 0.5 might not be label preserving.
+        seed: seed of the random generator. None, an int, a SeedSequence or a np.random.Generator.
+        output_size: (height, width) the crop is resampled to. None keeps the size of the crop.
+            The crop window and the resize are a single gather from the source image.
+        interpolation: interpolation used to resample to output_size. nearest or bilinear.
     '''
-    def __init__(self, method:str='center', value:float=0.3) -> None:
+    def __init__(self, method:str='center', value:float=0.3, seed=None, output_size:tuple=None, interpolation:str='bilinear') -> None:
         self.METHODS = ['center', 'random']
+        self.MULTI_CROP_MODES = ['random', 'grid']
 
         self.set_method(method)
         self.set_value(value)
+        self.set_rng(seed)
+        self.set_output_size(output_size)
+        self.set_interpolation(interpolation)
 
 
     def __repr__(self) -> str:
@@ -37,9 +46,9 @@ class Cropper():
 
     def __set_method(self, method:str) -> None:
         if method == 'center':
-            self.__method = self.__center_crop
+            self.__method = self.__center_box
         elif method == 'random':
-            self.__method = self.__random_crop
+            self.__method = self.__random_box
 
 
     def set_value(self, value:float) -> None:
@@ -53,52 +62,243 @@ class Cropper():
             print(f'Value set to default: {self.value}')
 
 
-    def __random_crop(self, img:np.ndarray) -> np.ndarray:
+    def set_output_size(self, output_size:tuple) -> None:
+        if output_size is None or (len(output_size) == 2 and all(int(s) == s and s > 0 for s in output_size)):
+            self.output_size = None if output_size is None else (int(output_size[0]), int(output_size[1]))
+        else:
+            self.output_size = None
+            print('Invalid output size entered. Must be None or (height, width) with positive integers.')
+            print(f'Output size set to default: {self.output_size}')
+
+
+    def set_interpolation(self, interpolation:str) -> None:
+        if interpolation in resampling.INTERPOLATIONS:
+            self.interpolation = interpolation
+        else:
+            self.interpolation = 'bilinear'
+            print('Invalid interpolation entered.')
+            print(f'Interpolation set to default: {self.interpolation}')
+
+
+    def __random_box(self, shape:tuple) -> tuple:
         '''
-        Crop images randomly in np.ndarray type.
+        Determine a random crop window of an image of the given shape.
             1. find a random position.
             2. determine vertical position in image.
             3. determine horizontal position in image.
             4. crop on both axis with given value.
+        Returns the window as (u, d, l, r).
         '''
         # randomize the position of cropping
-        r_ud = random.uniform(0.0, 1.0)
-        r_lr = random.uniform(0.0, 1.0)
+        r_ud = self.rng.uniform(0.0, 1.0)
+        r_lr = self.rng.uniform(0.0, 1.0)
 
         # crop is moved vertically
         value_ud = self.value / (1 + r_ud)
-        u = int(img.shape[0] * value_ud)
-        d = int(img.shape[0] * (1.0 - (self.value - value_ud)))
+        u = int(shape[0] * value_ud)
+        d = int(shape[0] * (1.0 - (self.value - value_ud)))
 
         # crop is moved horizontally
         value_lr = self.value / (1 + r_lr)
-        l = int(img.shape[1] * value_lr)
-        r = int(img.shape[1] * (1.0 - (self.value - value_lr)))
+        l = int(shape[1] * value_lr)
+        r = int(shape[1] * (1.0 - (self.value - value_lr)))
 
         # crop value on both axis
         # this obviously does NOT scale linearly. 
-        return img[u:d, l:r, :]
+        return u, d, l, r
 
 
-    def __center_crop(self, img:np.ndarray) -> np.ndarray:
+    def __center_box(self, shape:tuple) -> tuple:
         '''
-        Crop images in center by a given value in np.ndarray type.
+        Determine the centered crop window of an image of the given shape.
+        Returns the window as (u, d, l, r).
         '''
         # determine values for new image edges
         half_val = self.value / 2
-        u = int(img.shape[0] * (half_val))
-        d = int(img.shape[0] * (1 - half_val))
-        l = int(img.shape[1] * (half_val))
-        r = int(img.shape[1] * (1 - half_val))
+        u = int(shape[0] * (half_val))
+        d = int(shape[0] * (1 - half_val))
+        l = int(shape[1] * (half_val))
+        r = int(shape[1] * (1 - half_val))
 
         # crop value on both axis
         # this obviously does NOT scale linearly. 
-        return img[u:d, l:r, :]
+        return u, d, l, r
+
+
+    def crop_box(self, shape:tuple) -> tuple:
+        '''
+        Returns the crop window (u, d, l, r) for an image of the given shape.
+        Random windows are drawn from the random generator of the Cropper, so
+        the window can be chosen before the image is loaded.
+        params:
+            shape: Shape (H, W, ...) of the image
+        '''
+        return self.__method(shape)
+
+
+    def get_transform(self, shape:tuple) -> tuple:
+        '''
+        Returns the crop (and resize to output_size) as affine matrix mapping output
+        (x, y, 1) to source coordinates, together with the output shape (H, W).
+        Random windows are drawn anew on every call.
+        Raises a ValueError if the crop window is empty, e.g. for value 1.
+        params:
+            shape: Shape of the image to crop
+        '''
+        u, d, l, r = self.crop_box(shape)
+        if d <= u or r <= l:
+            raise ValueError(f'Can not transform: Crop window {(u, d, l, r)} of image of shape {tuple(shape[:2])} is empty.')
+        height, width = self.output_size if self.output_size is not None else (d - u, r - l)
+
+        # pixel centers are aligned like in the resampling of augment
+        scale_y, scale_x = (d - u) / height, (r - l) / width
+        matrix = np.array([[scale_x, 0, l + 0.5 * scale_x - 0.5],
+                           [0, scale_y, u + 0.5 * scale_y - 0.5],
+                           [0, 0, 1]])
+        return matrix, (height, width)
+
+
+    def __axis_map(self, start:int, stop:int, size:int, length:int) -> tuple:
+        '''
+        Maps size output pixels onto the source pixels start to stop of one axis.
+        Pixel centers are aligned, so the crop window is stretched evenly.
+        Returns indices and bilinear weights (None for nearest interpolation).
+        params:
+            start, stop: crop window on this axis
+            size: number of output pixels
+            length: number of source pixels
+        '''
+        scale = (stop - start) / size
+        centers = start + (np.arange(size) + 0.5) * scale
+
+        if self.interpolation == 'nearest':
+            indices = np.clip(np.floor(centers), start, max(start, stop - 1))
+            return indices.astype(np.intp), None
+
+        # stay inside the window and leave room for the right neighbour
+        coordinates = np.clip(centers - 0.5, start, max(start, stop - 1))
+        indices = np.minimum(np.floor(coordinates), max(length - 2, 0))
+        weights = (coordinates - indices).astype(np.float32)
+        return indices.astype(np.intp), weights
+
+
+    def __resample(self, img:np.ndarray, box:tuple, out:np.ndarray=None) -> np.ndarray:
+        '''
+        Resamples the crop window of an image to output_size in a single gather.
+        The map is separable, so only one row and one column of indices are built.
+        params:
+            img: Image to crop
+            box: crop window (u, d, l, r)
+            out: Optional buffer of shape output_size + img.shape[2:]
+        '''
+        u, d, l, r = box
+        height, width = self.output_size
+        if self.interpolation == 'bilinear' and min(img.shape[:2]) == 1:
+            # a single pixel is its own neighbour, broadcasting keeps this a view
+            img = np.broadcast_to(img, (max(img.shape[0], 2), max(img.shape[1], 2)) + img.shape[2:])
+        ys, wy = self.__axis_map(u, d, height, img.shape[0])
+        xs, wx = self.__axis_map(l, r, width, img.shape[1])
+
+        if wy is None:
+            indices = (ys[:, np.newaxis], xs[np.newaxis, :], None, None)
+        else:
+            indices = (ys[:, np.newaxis], xs[np.newaxis, :], wy[:, np.newaxis], wx[np.newaxis, :])
+        return resampling.sample(img, indices, out)
 
 
-    def augment(self, img:np.ndarray) -> np.ndarray:
+    def augment(self, img:np.ndarray, out:np.ndarray=None) -> np.ndarray:
         '''
         Takes an image in np.ndarray type as input.
         Returns a cropped image in np.ndarray type.
+        Without output_size the crop is a view of the input.
+        params:
+            img: Image to be augmented
+            out: Optional buffer to write the result into
+        '''
+        u, d, l, r = self.crop_box(img.shape)
+
+        if self.output_size is not None:
+            return self.__resample(img, (u, d, l, r), out)
+
+        crop = img[u:d, l:r, :]
+        if out is None:
+            return crop
+        out[...] = crop
+        return out
+
+
+    def __multi_crop_size(self, shape:tuple, size:tuple) -> tuple:
+        '''
+        Returns the crop size (h, w) used by multi_crop.
+        params:
+            shape: Shape (H, W, ...) of the image
+            size: Requested crop size or None to derive it from value
+        '''
+        if size is None:
+            size = (int(shape[0] * (1 - self.value)), int(shape[1] * (1 - self.value)))
+        if not (0 < size[0] <= shape[0] and 0 < size[1] <= shape[1]):
+            raise ValueError(f'Crop size {tuple(size)} does not fit into image of shape {shape[:2]}')
+        return int(size[0]), int(size[1])
+
+
+    def __grid_step(self, length:int, size:int, count:int) -> int:
+        '''
+        Returns the step between evenly spaced crop starts on one axis.
+        Raises a ValueError if the axis has fewer crop positions than crops.
+        params:
+            length: Number of image pixels on the axis
+            size: Number of crop pixels on the axis
+            count: Number of crops on the axis
+        '''
+        if count - 1 > length - size:
+            raise ValueError(f'Can not place {count} crops of size {size} on an axis of length {length}.')
+        if count == 1:
+            return 1
+        return (length - size) // (count - 1)
+
+
+    def multi_crop(self, img:np.ndarray, k, size:tuple=None, mode:str='random', boxes_only:bool=False) -> np.ndarray:
+        '''
+        Crops k windows of equal size from an image at once.
+            random: positions of all crops are drawn in one call and the crops are
+                gathered into one array of shape (k, h, w, C).
+            grid: crops on an evenly spaced grid are returned as a read-only strided
+                view of the image of shape (gy, gx, h, w, C). No pixels are copied.
+                Every axis needs at least one crop position per crop.
+        Crops are not resampled to output_size.
+        params:
+            img: Image of shape (H, W, C)
+            k: Number of crops. For grid either crops per axis or (gy, gx).
+            size: (h, w) of the crops. None derives the size from value like the center crop.
+            mode: random or grid
+            boxes_only: Return only the windows as array of rows (u, d, l, r)
+                instead of the crops, so they can be materialized lazily.
         '''
-        return self.__method(img)
+        if mode not in self.MULTI_CROP_MODES:
+            raise ValueError(f'Unknown multi crop mode {mode}. Must be one of {self.MULTI_CROP_MODES}')
+        height, width = self.__multi_crop_size(img.shape, size)
+
+        if mode == 'random':
+            # upper left corners of all crops in one draw
+            u, l = self.rng.integers(0, [[img.shape[0] - height], [img.shape[1] - width]], (2, k), endpoint=True)
+
+            if boxes_only:
+                return np.stack([u, u + height, l, l + width], axis=1)
+
+            ys = u[:, np.newaxis, np.newaxis] + np.arange(height)[:, np.newaxis]
+            xs = l[:, np.newaxis, np.newaxis] + np.arange(width)
+            return img[ys, xs]
+
+        grid_y, grid_x = (k, k) if np.isscalar(k) else k
+        step_y = self.__grid_step(img.shape[0], height, grid_y)
+        step_x = self.__grid_step(img.shape[1], width, grid_x)
+
+        if boxes_only:
+            u, l = np.meshgrid(np.arange(grid_y) * step_y, np.arange(grid_x) * step_x, indexing='ij')
+            u, l = u.ravel(), l.ravel()
+            return np.stack([u, u + height, l, l + width], axis=1)
+
+        # windows of shape (H - h + 1, W - w + 1, C, h, w) as view
+        windows = np.lib.stride_tricks.sliding_window_view(img, (height, width), axis=(0, 1))
+        windows = windows[:step_y * (grid_y - 1) + 1:step_y, :step_x * (grid_x - 1) + 1:step_x]
+        return np.moveaxis(windows, 2, -1)
@@ -1,9 +1,10 @@
 from math import sqrt
 import numpy as np
 import re
-import random
 
-class Eraser():
+from augmentator import seeding
+
+class Eraser(seeding.Randomized):
     '''
     Erases one or more rectangles from random positions of an image.
     Fills erased areas according to a specified filling method.
@@ -13,11 +14,12 @@ class Eraser():
         count: Count of areas to be erased.
         fill: Method to use for filling of erased areas. Possible values:
             color: Use a specified color to fill the areas.
-            gauss: Use a gaussian blur to fill the areas.
+            gauss: Use a blurred version of the image to fill the areas.
         color: Color to fill with
+        seed: Seed of the random generator. None, an int, a SeedSequence or a np.random.Generator.
     '''
 
-    def __init__(self, size:float=0.01, count:int=1, fill:str='color', color:str='#575757') -> None:
+    def __init__(self, size:float=0.01, count:int=1, fill:str='color', color:str='#575757', seed=None) -> None:
         # TODO: find fitting max_value
         # Constant values
         self.MAX_VALUE = 0.4
@@ -28,6 +30,7 @@ class Eraser():
         self.set_count(count)
         self.set_fill(fill)
         self.set_color(color)
+        self.set_rng(seed)
 
 
     def __repr__(self) -> str:
@@ -79,15 +82,15 @@ class Eraser():
         return tuple(int(self.color.lstrip('#')[i:i+2], 16) for i in (0, 2, 4))
 
 
-    def __color(self, img:np.ndarray) -> np.ndarray:
+    def __rectangles(self, img_shape:tuple, count_images:int=1) -> tuple:
         '''
-        Selects random positions for renctangles that are supposed to be erased.
-        Fills those rectangles with a specified color
+        Selects random positions for rectangles that are supposed to be erased.
+        All rectangles of all images are drawn at once.
+        Returns arrays start_y, end_y, start_x, end_x of shape (count_images, count).
         params:
-            img: Image to modify
+            img_shape: Shape (H, W, ...) of the images to erase from
+            count_images: Number of images to draw rectangles for
         '''
-        # erase position(s)
-        img_shape = np.shape(img)
         max_y, max_x = img_shape[0], img_shape[1]
         rel_size = int(max_x * max_y * self.size)
 
@@ -95,18 +98,100 @@ class Eraser():
 
         BUFFER = int(0.7 * sqrt_rel_size)
 
-        for _ in range(self.count):
-            x_len = random.randint(int(sqrt_rel_size - BUFFER), int(sqrt_rel_size + BUFFER))
+        shape = (count_images, self.count)
+        x_len = self.rng.integers(int(sqrt_rel_size - BUFFER), int(sqrt_rel_size + BUFFER), shape, endpoint=True)
+
+        y_len = rel_size // np.maximum(x_len, 1)
+
+        start_x = self.rng.integers(0, max_x- BUFFER, shape, endpoint=True)
+        start_y = self.rng.integers(0, max_y- BUFFER, shape, endpoint=True)
+        end_x = np.minimum(max_x, start_x + x_len)
+        end_y = np.minimum(max_y, start_y + y_len)
+
+        return start_y, end_y, start_x, end_x
+
+
+    def __mask(self, img_shape:tuple, rectangles:tuple) -> np.ndarray:
+        '''
+        Builds the erase mask of shape (N, H, W) from rectangles of shape (N, count).
+        Row and column memberships are compared by broadcasting and combined
+        with a batched matrix product, which counts the rectangles covering each pixel.
+        params:
+            img_shape: Shape (H, W, ...) of the images
+            rectangles: Arrays start_y, end_y, start_x, end_x as returned by __rectangles
+        '''
+        start_y, end_y, start_x, end_x = (edge[:, :, np.newaxis] for edge in rectangles)
+        ys = np.arange(img_shape[0])
+        xs = np.arange(img_shape[1])
+
+        # (N, count, H) and (N, count, W)
+        in_y = ((ys >= start_y) & (ys < end_y)).astype(np.float32)
+        in_x = ((xs >= start_x) & (xs < end_x)).astype(np.float32)
+
+        return np.matmul(in_y.transpose(0, 2, 1), in_x) > 0
+
+
+    def __color(self, img:np.ndarray) -> np.ndarray:
+        '''
+        Fills randomly positioned rectangles with a specified color
+        params:
+            img: Image to modify
+        '''
+        color = self.color[:img.shape[2]]
+        for start_y, end_y, start_x, end_x in zip(*(edge[0] for edge in self.__rectangles(img.shape))):
+            img[start_y:end_y, start_x:end_x] = color
+        return img
+
 
-            y_len = int(rel_size / x_len)
+    def __summed_area_table(self, img:np.ndarray) -> np.ndarray:
+        '''
+        Returns the summed-area table of an image with a leading row and column of zeros.
+        Entry [y, x] is the sum of all pixels above and left of (y, x).
+        params:
+            img: Image of shape (H, W, C)
+        '''
+        dtype = np.int64 if np.issubdtype(img.dtype, np.integer) else np.float64
+        table = np.zeros((img.shape[0] + 1, img.shape[1] + 1) + img.shape[2:], dtype=dtype)
+        np.cumsum(img, axis=0, dtype=dtype, out=table[1:, 1:])
+        np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+        return table
 
-            start_x = random.randint(0, max_x- BUFFER)
-            start_y = random.randint(0, max_y- BUFFER)
-            end_x = int(min(max_x, start_x + x_len))
-            end_y = int(min(max_y, start_y + y_len))
 
-            for c in range(img_shape[2]):
-                img[start_y:end_y, start_x:end_x, c] = self.color[c]
+    def __gauss(self, img:np.ndarray, rectangles:tuple=None) -> np.ndarray:
+        '''
+        Fills randomly positioned rectangles with a blurred version of the image.
+        The blur is a box filter with a radius of half the rectangle size, which
+        approximates a strong gaussian blur. All box sums are read from a single
+        summed-area table, so each rectangle costs O(area) independent of the radius.
+        params:
+            img: Image to modify
+            rectangles: Arrays start_y, end_y, start_x, end_x of shape (count,). Drawn if None.
+        '''
+        if rectangles is None:
+            rectangles = tuple(edge[0] for edge in self.__rectangles(img.shape))
+        if self.count == 0:
+            return img
+
+        # the table is built from the unmodified image, overlapping rectangles blur the original
+        table = self.__summed_area_table(img)
+        max_y, max_x = img.shape[0], img.shape[1]
+
+        for start_y, end_y, start_x, end_x in zip(*rectangles):
+            radius = max(1, max(end_y - start_y, end_x - start_x) // 2)
+
+            # box bounds of every pixel, cut off at the image borders
+            ys = np.arange(start_y, end_y)
+            xs = np.arange(start_x, end_x)
+            top, bottom = np.maximum(ys - radius, 0), np.minimum(ys + radius + 1, max_y)
+            left, right = np.maximum(xs - radius, 0), np.minimum(xs + radius + 1, max_x)
+
+            sums = table[np.ix_(bottom, right)] - table[np.ix_(top, right)] - table[np.ix_(bottom, left)] + table[np.ix_(top, left)]
+            area = np.outer(bottom - top, right - left)[:, :, np.newaxis]
+
+            mean = sums / area
+            if np.issubdtype(img.dtype, np.integer):
+                mean = np.rint(mean)
+            img[start_y:end_y, start_x:end_x] = mean
         return img
 
 
@@ -121,6 +206,38 @@ class Eraser():
             img = self.__color(img)
 
         elif self.fill == 'gauss':
-            print('Gaussian filling not supported yet...')
+            img = self.__gauss(img)
+
+        return img
+
+
+    def augment_batch(self, imgs:np.ndarray, out:np.ndarray=None) -> np.ndarray:
+        '''
+        Augments a batch of images of equal shape in place.
+        The rectangles of all images are drawn in one call. With color fill they are
+        combined into one erase mask that is filled with one masked write per channel.
+        params:
+            imgs: Batch of images of shape (N, H, W, C)
+            out: Optional buffer of the shape of imgs to write the result into
+        '''
+        if imgs.ndim != 4:
+            raise ValueError('Batch must be of shape (N, H, W, C)')
+
+        if out is not None:
+            np.copyto(out, imgs, casting='unsafe')
+            imgs = out
+
+        rectangles = self.__rectangles(imgs.shape[1:], imgs.shape[0])
+
+        if self.fill == 'color':
+            mask = self.__mask(imgs.shape[1:], rectangles)
+            # one masked write per channel is faster than broadcasting the color tuple
+            for c in range(imgs.shape[3]):
+                imgs[:, :, :, c][mask] = self.color[c]
+
+        elif self.fill == 'gauss':
+            # blurred fills depend on the image, every image gets its own table
+            for i, img in enumerate(imgs):
+                self.__gauss(img, tuple(edge[i] for edge in rectangles))
 
-        return img
\ No newline at end of file
+        return imgs
@@ -28,6 +28,20 @@ class Flipper():
             print('Axis must be either x, y or both (xy, yx)')
             print(f'Axis set to default: {self.axis}')
     
+    def get_transform(self, shape:tuple) -> tuple:
+        '''
+        Returns the flip as affine matrix mapping output (x, y, 1) to source
+        coordinates, together with the output shape (H, W).
+        params:
+            shape: Shape of the image to flip
+        '''
+        matrix = np.eye(3)
+        if 'x' in self.axis:
+            matrix[1] = [0, -1, shape[0] - 1]
+        if 'y' in self.axis:
+            matrix[0] = [-1, 0, shape[1] - 1]
+        return matrix, (shape[0], shape[1])
+
     def augment(self, img:np.ndarray) -> np.ndarray:
         '''
         Takes an image in np.ndarray type as input.
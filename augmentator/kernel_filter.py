@@ -1,5 +1,14 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
+from augmentator.lru_cache import LRUCache
+
+try:
+    import scipy.fft as scipy_fft
+except ImportError:
+    scipy_fft = None
+
 
 class KernelFilter():
     '''
@@ -9,10 +18,45 @@ class KernelFilter():
     params:
         method: kernel with which image will be filtered
         value: intensity of chosen filter method
+        cache_size: number of kernel images kept in a LRU cache. Kernels are keyed
+            by image shape, method and value. 0 disables caching.
+        precision: floating point precision of the filtering. Possible values:
+            float64: default precision
+            float32: halves the memory of the frequency domain, slightly less exact
+        engine: domain in which the image is filtered. Possible values:
+            auto: choose the cheaper engine from kernel support and image size
+            fft: multiply with the kernel in the frequency domain
+            spatial: convolve with separable 1D kernels in the image domain
+            Both engines filter circularly like the FFT. The spatial kernels are truncated
+            such that results differ by at most 1 per pixel value.
+        padding: handling of image dimensions. Possible values:
+            crop: remove the first row/column of odd dimensions
+            reflect: pad to the next even 5-smooth length by reflecting the image
+            edge: pad to the next even 5-smooth length by repeating the edge pixels
+            Padded images are cropped back, so the output shape equals the input shape.
+        fft_backend: library used for the FFT. Possible values:
+            numpy: always available
+            scipy: requires scipy, parallelizes the transforms itself
+        workers: number of threads used for filtering
+        cache_spectrum: keep the spectrum of the most recent image of augment_multi,
+            so filtering the same image again skips the forward FFT
     '''
-    def __init__(self, method:str='gaussian_high_pass', value:float=0.5) -> None:
+    def __init__(self, method:str='gaussian_high_pass', value:float=0.5, cache_size:int=8, precision:str='float64', engine:str='auto', padding:str='crop', fft_backend:str='numpy', workers:int=1, cache_spectrum:bool=False) -> None:
         self.METHODS = ['gaussian_high_pass', 'gaussian_low_pass']
+        self.PRECISIONS = ['float64', 'float32']
+        self.ENGINES = ['auto', 'fft', 'spatial']
+        self.PADDINGS = ['crop', 'reflect', 'edge']
+        self.FFT_BACKENDS = ['numpy', 'scipy']
+        self.SPATIAL_TOLERANCE = 1e-3
+        self.cache = LRUCache(cache_size)
+        self.cache_spectrum = cache_spectrum
+        self.__spectrum = None
         self.set_method(method)
+        self.set_precision(precision)
+        self.set_engine(engine)
+        self.set_padding(padding)
+        self.set_fft_backend(fft_backend)
+        self.set_workers(workers)
         self.value = value
 
 
@@ -29,6 +73,59 @@ class KernelFilter():
             print(f'Method set to default: {self.method}')
 
 
+    def set_precision(self, precision:str) -> None:
+        if precision in self.PRECISIONS:
+            self.precision = precision
+        else:
+            self.precision = 'float64'
+            print('Invalid precision entered.')
+            print(f'Precision set to default: {self.precision}')
+
+
+    def set_engine(self, engine:str) -> None:
+        if engine in self.ENGINES:
+            self.engine = engine
+        else:
+            self.engine = 'auto'
+            print('Invalid engine entered.')
+            print(f'Engine set to default: {self.engine}')
+
+
+    def set_padding(self, padding:str) -> None:
+        if padding in self.PADDINGS:
+            self.padding = padding
+        else:
+            self.padding = 'crop'
+            print('Invalid padding entered.')
+            print(f'Padding set to default: {self.padding}')
+
+
+    def set_fft_backend(self, fft_backend:str) -> None:
+        if fft_backend == 'scipy' and scipy_fft is None:
+            self.fft_backend = 'numpy'
+            print('FFT backend scipy is not installed.')
+            print(f'FFT backend set to default: {self.fft_backend}')
+        elif fft_backend in self.FFT_BACKENDS:
+            self.fft_backend = fft_backend
+        else:
+            self.fft_backend = 'numpy'
+            print('Invalid FFT backend entered.')
+            print(f'FFT backend set to default: {self.fft_backend}')
+
+
+    def set_workers(self, workers:int) -> None:
+        if workers >= 1:
+            self.workers = workers
+        else:
+            self.workers = 1
+            print('Invalid number of workers entered. Must be at least 1.')
+            print(f'Workers set to default: {self.workers}')
+
+
+    def set_cache_size(self, cache_size:int) -> None:
+        self.cache.set_maxsize(cache_size)
+
+
     def set_value(self, value:str) -> None:
         if 0 <= value <= 1:
             self.value = value
@@ -45,83 +142,281 @@ class KernelFilter():
         return bool(num % 2)
 
 
-    def __distance(self, p1, p2) -> float:
+    def __next_fast_length(self, num:int) -> int:
         '''
-        Calculates the euclidian distance between two points
+        Returns the smallest even length >= num without prime factors larger than 5.
+        FFTs are fastest on such lengths and even lengths keep the kernel center on the grid.
         '''
-        return np.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
+        length = num + self.__is_odd(num)
+        while True:
+            remainder = length
+            for factor in (2, 3, 5):
+                while remainder % factor == 0:
+                    remainder //= factor
+            if remainder == 1:
+                return length
+            length += 2
+
+
+    def __gaussian(self, size:int, value:float) -> np.ndarray:
+        '''
+        Calculate the one dimensional gaussian profile of the kernel along an axis of given size.
+        The profile is centered, its maximum is at index size / 2.
+        '''
+        d_zero = value * 100
+        distance = np.arange(size) - size / 2
+        return np.exp(-distance**2 / (2 * d_zero**2))
 
 
-    def __gaussian_low_pass(self, img_shape) -> np.ndarray:
+    def __gaussian_low_pass(self, img_shape, value:float) -> np.ndarray:
         '''
         Calculate the gaussian low pass kernel image for a given image shape.
+        The kernel is separable, so it is the outer product of its row and column profiles.
+        Profiles are pre-shifted such that the kernel matches the unshifted spectrum of a
+        real FFT, which only contains the non-negative column frequencies.
         '''
-        base = np.zeros(img_shape)
         rows, cols = img_shape
-        d_zero = self.value * 100
+        row_profile = np.fft.ifftshift(self.__gaussian(rows, value))
+        col_profile = np.fft.ifftshift(self.__gaussian(cols, value))[:cols // 2 + 1]
+        return np.outer(row_profile, col_profile)
+
+
+    def __gaussian_high_pass(self, img_shape, value:float) -> np.ndarray:
+        '''
+        Calculate the gaussian high pass kernel image for a given image shape.
+        '''
+        return 1 - self.__gaussian_low_pass(img_shape, value)
+
+
+    def __get_kernel(self, img_shape, method:str, value:float) -> np.ndarray:
+        '''
+        Returns the kernel image of a method and value for a given image shape.
+        Kernels are looked up in the cache and only computed on a miss.
+        '''
+        key = (tuple(img_shape), method, value, self.precision)
+        kernel_img = self.cache.get(key)
+        if kernel_img is None:
+            if method == 'gaussian_high_pass':
+                kernel_img = self.__gaussian_high_pass(img_shape, value)
+            elif method == 'gaussian_low_pass':
+                kernel_img = self.__gaussian_low_pass(img_shape, value)
+            kernel_img = kernel_img.astype(self.precision)
+            kernel_img.flags.writeable = False
+            self.cache.put(key, kernel_img)
+        return kernel_img
+
+
+    def __rfft2(self, img:np.ndarray, axes:tuple) -> np.ndarray:
+        '''
+        Real FFT over the given axes with the selected FFT backend.
+        '''
+        if self.fft_backend == 'scipy':
+            return scipy_fft.rfft2(img, axes=axes, workers=self.workers)
+        return np.fft.rfft2(img, axes=axes)
 
-        center = (rows/2, cols/2)
-        for x in range(cols):
-            for y in range(rows):
-                base[y,x] = np.exp(((-self.__distance((y,x), center)**2) / (2*(d_zero**2))))
 
-        return base
+    def __irfft2(self, spectrum:np.ndarray, shape:tuple, axes:tuple) -> np.ndarray:
+        '''
+        Inverse real FFT over the given axes with the selected FFT backend.
+        '''
+        if self.fft_backend == 'scipy':
+            return scipy_fft.irfft2(spectrum, s=shape, axes=axes, workers=self.workers)
+        return np.fft.irfft2(spectrum, s=shape, axes=axes)
 
 
-    def __gaussian_high_pass(self, img_shape) -> np.ndarray:
+    def __filter_image(self, img:np.ndarray, kernel_img:np.ndarray, axes:tuple=(0, 1)) -> np.ndarray:
         '''
-        Calculate the gaussian high pass kernel image for a given image shape.
+        Method to filter a colored image (or batch of images) with a given kernel.
+        All channels are tranformed into their frequency domain at once with a real FFT.
+        There they are multiplied with the pre-shifted kernel, so no shifting is needed.
+        Lastly the frequency domain is retransformed into the color channels.
         '''
-        base = np.zeros(img_shape)
-        rows, cols = img_shape
-        d_zero = self.value * 100
+        # perform fft on all image channels
+        spectrum = self.__rfft2(img.astype(self.precision, copy=False), axes)
+
+        shape = (img.shape[axes[0]], img.shape[axes[1]])
+        return self.__filter_spectrum(spectrum, kernel_img, shape, axes, in_place=True)
+
+
+    def __filter_spectrum(self, spectrum:np.ndarray, kernel_img:np.ndarray, shape:tuple, axes:tuple, in_place:bool=False) -> np.ndarray:
+        '''
+        Multiplies a spectrum with a kernel and transforms it back into the image domain.
+        params:
+            spectrum: real FFT of the image channels
+            kernel_img: pre-shifted kernel
+            shape: shape of the image on the transformed axes
+            axes: transformed axes
+            in_place: whether the spectrum may be overwritten
+        '''
+        # apply filter, broadcast over all other axes
+        kernel_shape = [1] * spectrum.ndim
+        kernel_shape[axes[0]], kernel_shape[axes[1]] = kernel_img.shape
+        if in_place:
+            spectrum *= kernel_img.reshape(kernel_shape)
+        else:
+            spectrum = spectrum * kernel_img.reshape(kernel_shape)
+
+        # perform inverse fft on all image channels
+        filtered = self.__irfft2(spectrum, shape, axes)
+        np.abs(filtered, out=filtered)
+
+        return filtered.astype(int)
+
+
+    def __get_spatial_kernel(self, size:int) -> np.ndarray:
+        '''
+        Returns the 1D spatial kernel equivalent to the gaussian profile along an axis.
+        The kernel is the inverse FFT of the profile, truncated where the weight of
+        the cut off taps drops below SPATIAL_TOLERANCE. Its center tap is at index len(kernel) // 2.
+        '''
+        key = ('spatial', size, self.value, self.precision)
+        kernel = self.cache.get(key)
+        if kernel is None:
+            circular = np.fft.ifft(np.fft.ifftshift(self.__gaussian(size, self.value))).real
+
+            # weight outside of radius r for every r, kernel is symmetric
+            magnitude = np.abs(circular[:size // 2 + 1])
+            tail = np.cumsum(magnitude[::-1])[::-1] * 2
+            cut_off = np.append(tail[1:], 0)
+            radius = min(int(np.argmax(cut_off < self.SPATIAL_TOLERANCE)), (size - 1) // 2)
+
+            kernel = np.concatenate([circular[size - radius:], circular[:radius + 1]])
+            kernel = kernel.astype(self.precision)
+            kernel.flags.writeable = False
+            self.cache.put(key, kernel)
+        return kernel
+
+
+    def __convolve(self, img:np.ndarray, kernel:np.ndarray, axis:int) -> np.ndarray:
+        '''
+        Circular convolution of an image with a symmetric 1D kernel along an axis.
+        '''
+        radius = len(kernel) // 2
+        size = img.shape[axis]
+
+        pad_width = [(0, 0)] * img.ndim
+        pad_width[axis] = (radius, radius)
+        padded = np.moveaxis(np.pad(img, pad_width, mode='wrap'), axis, 0)
+
+        filtered = np.zeros(padded[:size].shape, dtype=self.precision)
+        tap = np.empty_like(filtered)
+        for k, weight in enumerate(kernel):
+            np.multiply(padded[k:k + size], weight, out=tap)
+            filtered += tap
+        return np.moveaxis(filtered, 0, axis)
 
-        center = (rows/2, cols/2)
-        for x in range(cols):
-            for y in range(rows):
-                base[y,x] = 1 - np.exp(((-self.__distance((y,x), center)**2) / (2*(d_zero**2))))
 
-        return base
+    def __filter_image_spatial(self, img:np.ndarray, axes:tuple=(0, 1)) -> np.ndarray:
+        '''
+        Method to filter a colored image (or batch of images) in the image domain.
+        The image is blurred with the separable low pass kernel along both axes.
+        The high pass filtered image is the image minus the blurred image.
+        '''
+        rows, cols = img.shape[axes[0]], img.shape[axes[1]]
+        img = img.astype(self.precision, copy=False)
 
+        filtered = self.__convolve(img, self.__get_spatial_kernel(rows), axis=axes[0])
+        filtered = self.__convolve(filtered, self.__get_spatial_kernel(cols), axis=axes[1])
 
-    def __get_kernel(self, img_shape) -> np.ndarray:
         if self.method == 'gaussian_high_pass':
-            return self.__gaussian_high_pass(img_shape)
-        elif self.method == 'gaussian_low_pass':
-            return self.__gaussian_low_pass(img_shape)
+            np.subtract(img, filtered, out=filtered)
+        np.abs(filtered, out=filtered)
 
+        return filtered.astype(int)
 
 
-    def __filter_image(self, img:np.ndarray, kernel_img:np.ndarray) -> np.ndarray:
+    def __use_spatial(self, img_shape) -> bool:
         '''
-        Method to filter a colored image with a given kernel.
-        Each channel of the image is tranformed into its frequency domain.
-        There it is shifted, multiplied with kernel and shifted back.
-        Lastly the frequency domain is retransformed into the color channel.
-        All color channels are the kernel filtered image.
+        Decides whether the spatial engine is cheaper than the FFT.
+        The spatial engine needs one pass per kernel tap on both axes,
+        the FFT needs passes in the order of the log of the image size.
         '''
-        filtered = []
-        for color_channel in range(3):
-            # extract color channel r,g,b
-            channel = img[:, :, color_channel]
-
-            # perform fft on image channel
-            channel = np.fft.fft2(channel)
-
-            # shift image, apply filter and shift back
-            channel = np.fft.fftshift(channel)
-            channel = channel * kernel_img
-            channel = np.fft.ifftshift(channel)
-            
-            # perform inverse fft on image channel
-            channel = np.fft.ifft2(channel)
-
-            filtered.append(np.abs(channel))
-        
-        # create filtered image from seperate channels
-        filtered = np.stack(filtered, axis=-1).astype(int)
-        
-        return filtered
+        if self.engine != 'auto':
+            return self.engine == 'spatial'
+
+        rows, cols = img_shape
+        taps = len(self.__get_spatial_kernel(rows)) + len(self.__get_spatial_kernel(cols))
+        return taps <= np.log2(rows * cols)
+
+
+    def __filter(self, img:np.ndarray, axes:tuple) -> np.ndarray:
+        '''
+        Filters an image (or batch of images) in the cheaper domain.
+        With more than one worker the numpy FFT and the spatial engine are run
+        on parts of the first free axis (batch or channels) in a thread pool.
+        '''
+        shape = (img.shape[axes[0]], img.shape[axes[1]])
+        if self.__use_spatial(shape):
+            filter_part = lambda part: self.__filter_image_spatial(part, axes)
+        else:
+            kernel_img = self.__get_kernel(shape, self.method, self.value)
+            filter_part = lambda part: self.__filter_image(part, kernel_img, axes)
+            if self.fft_backend == 'scipy':
+                # scipy parallelizes the transforms itself
+                return filter_part(img)
+
+        split_axis = [axis for axis in range(img.ndim) if axis not in axes][0]
+        if self.workers == 1 or img.shape[split_axis] == 1:
+            return filter_part(img)
+
+        parts = np.array_split(img, min(self.workers, img.shape[split_axis]), axis=split_axis)
+        with ThreadPoolExecutor(max_workers=len(parts)) as pool:
+            filtered = list(pool.map(filter_part, parts))
+        return np.concatenate(filtered, axis=split_axis)
+
+
+    def __pad(self, img:np.ndarray, axes:tuple) -> tuple:
+        '''
+        Makes the image dimensions on the given axes even or fast according to the
+        padding attribute. Returns the prepared image and the window of the
+        original image within the filtered result.
+        '''
+        rows, cols = img.shape[axes[0]], img.shape[axes[1]]
+        window = [slice(None)] * img.ndim
+
+        if self.padding == 'crop':
+            # check if any dimension of image is odd and make even
+            window[axes[0]] = slice(self.__is_odd(rows), None)
+            window[axes[1]] = slice(self.__is_odd(cols), None)
+            return img[tuple(window)], tuple([slice(None)] * img.ndim)
+
+        # pad to fast FFT lengths, image stays centered
+        pad_width = [(0, 0)] * img.ndim
+        for axis, size in zip(axes, (rows, cols)):
+            padding = self.__next_fast_length(size) - size
+            pad_width[axis] = (padding // 2, padding - padding // 2)
+            window[axis] = slice(padding // 2, padding // 2 + size)
+        return np.pad(img, pad_width, mode=self.padding), tuple(window)
+
+
+    def __filter_padded(self, img:np.ndarray, axes:tuple) -> np.ndarray:
+        '''
+        Pads, filters and crops the padding of an image.
+        '''
+        img, window = self.__pad(img, axes)
+        return self.__filter(img, axes)[window]
+
+
+    def __get_spectrum(self, img:np.ndarray, prepared:np.ndarray) -> np.ndarray:
+        '''
+        Returns the real FFT of a prepared image.
+        With cache_spectrum the spectrum of the most recent image is kept and
+        reused as long as the same image is filtered again.
+        params:
+            img: original image, used to recognize repeated images
+            prepared: padded or cropped image to transform
+        '''
+        key = (img.shape, img.dtype, self.padding, self.precision)
+        if self.cache_spectrum and self.__spectrum is not None:
+            last_key, last_img, spectrum = self.__spectrum
+            if last_key == key and np.array_equal(last_img, img):
+                return spectrum
+
+        spectrum = self.__rfft2(prepared.astype(self.precision, copy=False), (0, 1))
+        if self.cache_spectrum:
+            spectrum.flags.writeable = False
+            self.__spectrum = (key, img.copy(), spectrum)
+        return spectrum
 
 
     def augment(self, img:np.ndarray) -> np.ndarray:
@@ -129,16 +424,39 @@ class KernelFilter():
         Takes an image in np.ndarray type as input.
         Returns a kernel filtered image in np.ndarray type.
         '''
-        # check if any dimension of image is odd and make even
-        if self.__is_odd(img.shape[0]):
-            img = np.delete(img, 0, 0)
-        if self.__is_odd(img.shape[1]):
-            img = np.delete(img, 0, 1)
+        return self.__filter_padded(img, axes=(0, 1))
+
 
-        # get filter
-        kernel_img = self.__get_kernel((img.shape[0], img.shape[1]))
+    def augment_batch(self, imgs:np.ndarray) -> np.ndarray:
+        '''
+        Takes a batch of images of shape (N, H, W, C) in np.ndarray type as input.
+        All images share one cached kernel and are filtered in a single call.
+        Returns the kernel filtered images in np.ndarray type.
+        '''
+        if imgs.ndim != 4:
+            raise ValueError('Batch must be of shape (N, H, W, C)')
+        return self.__filter_padded(imgs, axes=(1, 2))
 
-        # filter image
-        img = self.__filter_image(img, kernel_img)
 
-        return img
\ No newline at end of file
+    def augment_multi(self, img:np.ndarray, configs:list) -> list:
+        '''
+        Filters one image with several kernels.
+        The forward FFT is computed once and shared by all kernels.
+        Returns one kernel filtered image in np.ndarray type per configuration.
+        params:
+            img: Image to be augmented
+            configs: list of (method, value) tuples
+        '''
+        for method, value in configs:
+            if method not in self.METHODS or not 0 <= value <= 1:
+                raise ValueError(f'Invalid configuration ({method}, {value}).')
+
+        prepared, window = self.__pad(img, (0, 1))
+        spectrum = self.__get_spectrum(img, prepared)
+        shape = (prepared.shape[0], prepared.shape[1])
+
+        filtered = []
+        for method, value in configs:
+            kernel_img = self.__get_kernel(shape, method, value)
+            filtered.append(self.__filter_spectrum(spectrum, kernel_img, shape, (0, 1))[window])
+        return filtered
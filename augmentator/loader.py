@@ -0,0 +1,107 @@
+from math import ceil
+
+import numpy as np
+from PIL import Image
+
+from augmentator.cropper import Cropper
+
+
+class Loader():
+    '''
+    Loads images from disk directly into the size needed by the augmentation pipeline.
+    The crop window is chosen before decoding. JPEGs are then decoded in draft mode,
+    which scales them down in the DCT domain by 1/2, 1/4 or 1/8 to the smallest
+    scale that still covers the target size. The crop window and the final
+    resize are applied to the drafted image in a single resampling step.
+    NOTE: Pillow always decodes the whole image, only the scale can be reduced.
+
+    params:
+        cropper: Cropper whose crop window is applied while loading. None loads the whole image.
+            If the cropper has an output_size, it is used as target_size.
+        target_size: (height, width) of the loaded images. None keeps the size of the
+            (cropped) image at full resolution.
+        mode: Pillow mode of the loaded images, e.g. RGB or L.
+    '''
+    def __init__(self, cropper:Cropper=None, target_size:tuple=None, mode:str='RGB') -> None:
+        self.set_cropper(cropper)
+        self.set_target_size(target_size)
+        self.set_mode(mode)
+
+
+    def __repr__(self) -> str:
+        return f'Loading {self.mode} images with target size {self.target_size}.'
+
+
+    def set_cropper(self, cropper:Cropper) -> None:
+        # verify type
+        if cropper is not None and not isinstance(cropper, Cropper):
+            raise ValueError('Can not set cropper: Not a Cropper.')
+        else:
+            self.cropper = cropper
+
+
+    def set_target_size(self, target_size:tuple) -> None:
+        if target_size is None or (len(target_size) == 2 and all(int(s) == s and s > 0 for s in target_size)):
+            self.target_size = None if target_size is None else (int(target_size[0]), int(target_size[1]))
+        else:
+            self.target_size = None
+            print('Invalid target size entered. Must be None or (height, width) with positive integers.')
+            print(f'Target size set to default: {self.target_size}')
+
+
+    def set_mode(self, mode:str) -> None:
+        if mode in Image.MODES:
+            self.mode = mode
+        else:
+            self.mode = 'RGB'
+            print('Invalid mode entered.')
+            print(f'Mode set to default: {self.mode}')
+
+
+    def __get_target_size(self) -> tuple:
+        '''
+        Returns the target size, preferring the one given to the loader.
+        '''
+        if self.target_size is not None:
+            return self.target_size
+        if self.cropper is not None:
+            return self.cropper.output_size
+        return None
+
+
+    def load(self, path:str) -> np.ndarray:
+        '''
+        Loads an image from disk as np.ndarray of shape (H, W, C), or (H, W) for single band modes.
+            1. read the header to get the full size.
+            2. choose the crop window in full resolution.
+            3. request the smallest draft scale that covers the target size.
+            4. crop and resize the drafted image in one step.
+        params:
+            path: Location of the image on disk
+        '''
+        with Image.open(path) as img:
+            width, height = img.size
+
+            # crop window in full resolution
+            if self.cropper is not None:
+                u, d, l, r = self.cropper.crop_box((height, width))
+            else:
+                u, d, l, r = 0, height, 0, width
+
+            target_size = self.__get_target_size()
+
+            if target_size is None:
+                img = img.convert(self.mode) if img.mode != self.mode else img
+                return np.array(img.crop((l, u, r, d)))
+
+            # draft keeps the image at least as large as requested
+            requested = (ceil(width * target_size[1] / max(r - l, 1)), ceil(height * target_size[0] / max(d - u, 1)))
+            img.draft(self.mode, requested)
+            scale_x, scale_y = width / img.size[0], height / img.size[1]
+
+            if img.mode != self.mode:
+                img = img.convert(self.mode)
+
+            box = (l / scale_x, u / scale_y, r / scale_x, d / scale_y)
+            img = img.resize((target_size[1], target_size[0]), Image.BILINEAR, box=box)
+            return np.array(img)
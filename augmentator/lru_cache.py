@@ -0,0 +1,80 @@
+from collections import OrderedDict
+
+
+class LRUCache():
+    '''
+    Size-bounded cache that evicts the least recently used entry first.
+    Counts hits and misses to allow tuning of the cache size.
+
+    params:
+        maxsize: Maximum number of entries. A size of 0 disables caching.
+    '''
+    def __init__(self, maxsize:int=8) -> None:
+        self.__entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.set_maxsize(maxsize)
+
+
+    def __repr__(self) -> str:
+        return f'LRUCache with {len(self)} of {self.maxsize} entries ({self.hits} hits, {self.misses} misses).'
+
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+
+    def __contains__(self, key) -> bool:
+        return key in self.__entries
+
+
+    def set_maxsize(self, maxsize:int) -> None:
+        if maxsize >= 0:
+            self.maxsize = maxsize
+        else:
+            self.maxsize = 8
+            print('Invalid cache size entered. Size must not be negative.')
+            print(f'Cache size set to default: {self.maxsize}')
+        self.__evict()
+
+
+    def get(self, key):
+        '''
+        Returns the entry stored for key or None and updates the counters.
+        params:
+            key: Hashable key of the entry
+        '''
+        if key in self.__entries:
+            self.hits += 1
+            self.__entries.move_to_end(key)
+            return self.__entries[key]
+        self.misses += 1
+        return None
+
+
+    def put(self, key, value) -> None:
+        '''
+        Stores value for key and evicts the least recently used entries if necessary.
+        params:
+            key: Hashable key of the entry
+            value: Entry to store
+        '''
+        if self.maxsize == 0:
+            return
+        self.__entries[key] = value
+        self.__entries.move_to_end(key)
+        self.__evict()
+
+
+    def clear(self) -> None:
+        '''
+        Removes all entries and resets the counters.
+        '''
+        self.__entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+    def __evict(self) -> None:
+        while len(self.__entries) > self.maxsize:
+            self.__entries.popitem(last=False)
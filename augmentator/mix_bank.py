@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+
+
+class MixBank():
+    '''
+    Bank of mix images stored in a memory-mapped file on disk.
+    Images are read lazily from the page cache, so the bank is never loaded
+    into RAM as a whole and worker processes share the same pages.
+    A bank folder contains two files:
+        data.bin: raw uint8 pixel values of all images, one after another
+        index.npy: one row (offset, height, width, channels) per image
+
+    params:
+        bank_folder: location of the bank on disk.
+    '''
+    def __init__(self, bank_folder:str) -> None:
+        self.set_bank_folder(bank_folder)
+
+
+    def __repr__(self) -> str:
+        return f'Mix bank with {len(self)} images at {self.bank_folder}'
+
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+    def __getitem__(self, i:int) -> np.ndarray:
+        '''
+        Returns image i as read-only view of the memory map.
+        '''
+        offset, height, width, channels = self.index[i]
+        return self.data[offset:offset + height * width * channels].reshape(height, width, channels)
+
+
+    def __getstate__(self) -> dict:
+        # only the location is sent to worker processes, they map the file themselves
+        return {'bank_folder': self.bank_folder}
+
+
+    def __setstate__(self, state:dict) -> None:
+        self.set_bank_folder(state['bank_folder'])
+
+
+    def set_bank_folder(self, bank_folder:str) -> None:
+        data_file = os.path.join(bank_folder, 'data.bin')
+        index_file = os.path.join(bank_folder, 'index.npy')
+        if not (os.path.isfile(data_file) and os.path.isfile(index_file)):
+            raise ValueError(f'Mix bank not found. Could not load {bank_folder}.')
+        if os.path.getsize(data_file) == 0:
+            raise ValueError(f'Mix bank is empty. Could not load {bank_folder}.')
+        self.bank_folder = bank_folder
+        self.index = np.load(index_file)
+        self.data = np.memmap(data_file, dtype=np.uint8, mode='r')
+
+
+    @staticmethod
+    def create(bank_folder:str, images) -> 'MixBank':
+        '''
+        Writes images into a new bank folder and returns the opened bank.
+        Images are streamed to disk one by one, so images may be any iterable.
+        params:
+            bank_folder: location of the bank on disk. Is created if necessary.
+            images: iterable of uint8 images of shape (H, W, C). Must contain at least one pixel.
+        '''
+        os.makedirs(bank_folder, exist_ok=True)
+
+        index = []
+        offset = 0
+        with open(os.path.join(bank_folder, 'data.bin'), 'wb') as data_file:
+            for img in images:
+                img = np.ascontiguousarray(img, dtype=np.uint8)
+                data_file.write(img.tobytes())
+                index.append((offset,) + img.shape)
+                offset += img.size
+
+        if offset == 0:
+            os.remove(os.path.join(bank_folder, 'data.bin'))
+            raise ValueError('Can not create mix bank: No images with pixels given.')
+
+        np.save(os.path.join(bank_folder, 'index.npy'), np.array(index, dtype=np.int64).reshape(-1, 4))
+        return MixBank(bank_folder)
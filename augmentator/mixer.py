@@ -1,6 +1,10 @@
 import numpy as np
 
-class Mixer():
+from augmentator import seeding
+from augmentator.lru_cache import LRUCache
+from augmentator.mix_bank import MixBank
+
+class Mixer(seeding.Randomized):
     '''
     Mixes the pixel values of two images.
     params:
@@ -8,18 +12,41 @@ class Mixer():
             avg: Use average pixel values of both images.
             rel: Use weighted values.
         value: Weight to use for method rel. rel with value 0.5 equals avg.
+        mix_img: Image to mix into the augmented images. augment needs either mix_img or
+            mix_bank, augment_batch mixes within the batch and needs neither.
+        cache_size: Number of padded versions of mix_img kept per target shape.
+        mix_bank: MixBank to draw mixing partners from. Replaces mix_img if no mix_img is given.
+        blending: Arithmetic used for mixing. Possible values:
+            float: Weighted sum in floating point, returns int32 images.
+            fixed: Fixed-point weights with uint16 accumulators for uint8 images,
+                returns uint8 images. Weights are rounded to multiples of 1/256.
+        seed: Seed of the random generator drawing partners and weights.
+            None, an int, a SeedSequence or a np.random.Generator.
     '''
     
-    def __init__(self, method:str='avg', value:float=0.5, mix_img:np.ndarray=None) -> None:
+    def __init__(self, method:str='avg', value:float=0.5, mix_img:np.ndarray=None, cache_size:int=8, mix_bank:MixBank=None, blending:str='float', seed=None) -> None:
         
         # constant values
         self.METHODS = ['avg', 'rel']
+        self.BLENDINGS = ['float', 'fixed']
         self.FILL_VALUE = 255
+        # bytes of a float64 temporary per row block
+        self.BLOCK_SIZE = 1 << 16
+
+        # padded mix images per target shape
+        self.cache = LRUCache(cache_size)
 
         # set attributes
         self.set_method(method)
         self.set_value(value)
-        self.set_mix_img(mix_img)
+        self.set_blending(blending)
+        self.set_rng(seed)
+        self.set_mix_bank(mix_bank)
+        # augment_batch mixes within the batch and needs no partner image
+        if mix_img is not None:
+            self.set_mix_img(mix_img)
+        else:
+            self.mix_img = None
 
 
     def __repr__(self) -> str:
@@ -44,127 +71,279 @@ class Mixer():
             print(f'Value set to default: {self.value}')
 
 
+    def set_blending(self, blending:str) -> None:
+        if blending in self.BLENDINGS:
+            self.blending = blending
+        else:
+            self.blending = 'float'
+            print('Invalid blending entered.')
+            print(f'Blending set to default: {self.blending}')
+
+
     def set_mix_img(self, mix_img:np.ndarray) -> None:
         # verify type
         if type(mix_img) != np.ndarray:
             raise ValueError(f'Can not Initialize Mixer: No mixing Image.')
         else:
             self.mix_img = mix_img
+            self.cache.clear()
+
+
+    def set_mix_bank(self, mix_bank:MixBank) -> None:
+        # verify type
+        if mix_bank is not None and not isinstance(mix_bank, MixBank):
+            raise ValueError(f'Can not set mix bank: Not a MixBank.')
+        else:
+            self.mix_bank = mix_bank
+
+
+    def __draw_partner(self, index:int) -> np.ndarray:
+        '''
+        Returns a mixing partner from the mix bank.
+        params:
+            index: Index of the partner in the bank. Drawn at random if None.
+        '''
+        if self.mix_bank is None:
+            raise ValueError('Can not mix: No mixing Image and no mix bank.')
+        if index is None:
+            index = self.rng.integers(len(self.mix_bank))
+        return self.mix_bank[index]
 
 
-    def __reshape(self, img_1:np.ndarray, img_2:np.ndarray):
+    def __pad(self, img:np.ndarray, shape:tuple) -> np.ndarray:
         '''
-        Assimilates the shapes of img_1 and img_2 such, that they both are
-            (max(img_1[x], img_2[x]), max(img_1[y], img_2[y], 3)
-        Added areas contain solely white pixels.
+        Pads an image to shape (H, W) by placing it centered on a single white canvas.
+        The canvas keeps the dtype of the image.
         params:
-            img_1, img_2: Images to reshape.
+            img: Image to pad
+            shape: Desired height and width, not smaller than the image
         '''
+        if img.shape[:2] == shape:
+            return img
 
-        # get shapes
-        shape_1 = img_1.shape
-        shape_2 = img_2.shape
+        top = (shape[0] - img.shape[0]) // 2
+        left = (shape[1] - img.shape[1]) // 2
 
-        # no difference, no computation needed
-        if shape_1 == shape_2:
-            return img_1, img_2
+        canvas = np.full(shape + img.shape[2:], fill_value=self.FILL_VALUE, dtype=img.dtype)
+        canvas[top:top + img.shape[0], left:left + img.shape[1]] = img
+        return canvas
 
-        # get differences between images and desired values
-        x_diff, y_diff, x_desired, y_desired = 0, 0, 0, 0
-        if shape_1[0] != shape_2[0]:
-            y_diff = abs(shape_1[0] - shape_2[0])
-            y_desired = max(shape_1[0], shape_2[0])
-        if shape_1[1] != shape_2[1]:
-            x_diff = abs(shape_1[1] - shape_2[1])
-            x_desired = max(shape_1[1], shape_2[1])
 
-        # resize
-        if y_diff != 0:
-            # need to add rows
-            add_on_top = y_diff // 2
-            add_on_bottom = y_diff - add_on_top
+    def __get_mix_img(self, shape:tuple) -> np.ndarray:
+        '''
+        Returns mix_img padded to shape (H, W).
+        Padded mix images are cached per target shape.
+        params:
+            shape: Desired height and width
+        '''
+        mix_img = self.cache.get(shape)
+        if mix_img is None:
+            mix_img = self.__pad(self.mix_img, shape)
+            self.cache.put(shape, mix_img)
+        return mix_img
 
-            # height of img_1
-            if shape_1[0] < y_desired:
-                top_array = np.full(shape=(add_on_top, shape_1[1], 3), fill_value=self.FILL_VALUE, dtype=np.int32)
-                bottom_array = np.full(shape=(add_on_bottom, shape_1[1], 3), fill_value=self.FILL_VALUE, dtype=np.int32)
 
-                img_1 = np.append(top_array, img_1, axis=0)
-                img_1 = np.append(img_1, bottom_array, axis=0)
+    def __avg(self, img_1, img_2, out:np.ndarray) -> np.ndarray:
+        '''
+        Method for mixing two images by averaging their pixel values.
+        The sum is accumulated in the wider dtype of out to prevent overflows.
+        params:
+            img_1, img_2: images (or fill value) to be mixed
+            out: buffer for the mixed image
+        '''
+        np.add(img_1, img_2, out=out, dtype=out.dtype, casting='unsafe')
+        return np.floor_divide(out, 2, out=out)
 
-            # height of img_2
-            if shape_2[0] < y_desired:
-                top_array = np.full(shape=(add_on_top, shape_2[1], 3), fill_value=self.FILL_VALUE, dtype=np.int32)
-                bottom_array = np.full(shape=(add_on_bottom, shape_2[1], 3), fill_value=self.FILL_VALUE, dtype=np.int32)
 
-                img_2 = np.append(top_array, img_2, axis=0)
-                img_2 = np.append(img_2, bottom_array, axis=0)
-            
-        # update shapes to correctly compute array widths
-        shape_1 = img_1.shape
-        shape_2 = img_2.shape
+    def __rel(self, img_1, img_2, out:np.ndarray, weight) -> np.ndarray:
+        '''
+        Method for mixing two images with a specified weight.
+        params:
+            img_1: image (or fill value) wich pixels are weighted weight times
+            img_2: image wich pixels are weighted 1 - weight times
+            out: buffer for the mixed image
+            weight: scalar weight or weights broadcastable to the images
+        '''
+        # important: cast to int
+        out[...] = np.add(np.multiply(img_1, weight), np.multiply(img_2, 1-weight))
+        return out
 
-        if x_diff != 0:
-            # need to add columns
-            add_left = x_diff // 2
-            add_right = x_diff - add_left
 
-            # width of img_1
-            if shape_1[1] < x_desired:
-                left_array = np.full(shape=(shape_1[0], add_left, 3), fill_value=self.FILL_VALUE, dtype=np.int32)
-                right_array = np.full(shape=(shape_1[0], add_right, 3), fill_value=self.FILL_VALUE, dtype=np.int32)
+    def __avg_fixed(self, img_1, img_2, out:np.ndarray) -> np.ndarray:
+        '''
+        Method for averaging two uint8 images in a uint16 accumulator.
+        params:
+            img_1, img_2: images (or fill value) to be mixed
+            out: uint8 buffer for the mixed image
+        '''
+        acc = np.add(img_2, img_1, dtype=np.uint16)
+        return np.right_shift(acc, 1, out=out, casting='unsafe')
 
-                img_1 = np.append(left_array, img_1, axis=1)
-                img_1 = np.append(img_1, right_array, axis=1)
 
-            # width of img_2
-            if shape_2[1] < x_desired:
-                left_array = np.full(shape=(shape_2[0], add_left, 3), fill_value=self.FILL_VALUE, dtype=np.int32)
-                right_array = np.full(shape=(shape_2[0], add_right, 3), fill_value=self.FILL_VALUE, dtype=np.int32)
+    def __rel_fixed(self, img_1, img_2, out:np.ndarray, weight) -> np.ndarray:
+        '''
+        Method for mixing two uint8 images with a fixed-point weight.
+        The weights are scaled to 8 bit fractions, so the weighted sum of two
+        uint8 values never exceeds the uint16 accumulator.
+        params:
+            img_1: image (or fill value) wich pixels are weighted weight times
+            img_2: image wich pixels are weighted 1 - weight times
+            out: uint8 buffer for the mixed image
+            weight: scalar weight or weights broadcastable to the images
+        '''
+        weight = np.rint(np.multiply(weight, 256)).astype(np.uint16)
 
-                img_2 = np.append(left_array, img_2, axis=1)
-                img_2 = np.append(img_2, right_array, axis=1)
+        acc = np.multiply(img_2, 256 - weight, dtype=np.uint16)
+        acc += np.multiply(img_1, weight, dtype=np.uint16)
 
-        return img_1, img_2
+        # round to nearest and drop the fraction
+        acc += 128
+        return np.right_shift(acc, 8, out=out, casting='unsafe')
 
 
-    def __avg(self, img_1:np.ndarray, img_2:np.ndarray) -> np.ndarray:
+    def __mix(self, img_1, img_2, out:np.ndarray, weight=None) -> np.ndarray:
         '''
-        Method for mixing two images by averaging their pixel values.
+        Mixes in blocks of rows. Blocks are sized so that a float64 temporary of a
+        block takes about BLOCK_SIZE bytes, so temporaries of the weighted sums and
+        accumulators stay a few BLOCK_SIZE bytes for images of any size.
         params:
-            img_1, img_2: images to be mixed
+            img_1, img_2: images (or fill value) to be mixed, broadcastable to out
+            out: buffer for the mixed image
+            weight: weight of img_1 for rel mixing. None uses the method and value of the Mixer.
         '''
-        return np.add(img_1, img_2) // 2
+        block_rows = max(1, self.BLOCK_SIZE // (out[0].size * np.dtype(np.float64).itemsize or 1))
+        for start in range(0, out.shape[0], block_rows):
+            rows = slice(start, start + block_rows)
+            self.__mix_block(self.__get_rows(img_1, rows, out), self.__get_rows(img_2, rows, out), out[rows], weight)
+        return out
 
 
-    def __rel(self, img_1:np.ndarray, img_2:np.ndarray) -> np.ndarray:
+    def __mix_batch(self, imgs:np.ndarray, permutation:np.ndarray, out:np.ndarray, weights:np.ndarray=None) -> np.ndarray:
         '''
-        Method for mixing two images with a specified weight.
+        Mixes a batch with its partners in blocks of samples like __mix does with rows.
+        Images larger than a block are mixed one at a time in blocks of rows.
+        Partners are gathered per block, so the permuted batch is never materialized.
         params:
-            img_1: image wich pixels are weighted self.value times
-            img_2: image wich pixels are weighted 1 - self.value times
+            imgs: batch of shape (N, H, W, C)
+            permutation: partner index for every image
+            out: buffer for the mixed batch
+            weights: per-sample weights of imgs for rel mixing. None uses the method and value of the Mixer.
         '''
-        mix_img = np.add(np.multiply(img_1, self.value), np.multiply(img_2, 1-self.value))
-        # important: cast to int
-        return mix_img.astype(np.int32)
+        block_samples = self.BLOCK_SIZE // (out[0].size * np.dtype(np.float64).itemsize or 1)
+        if block_samples < 2:
+            for i in range(imgs.shape[0]):
+                self.__mix(imgs[i], imgs[permutation[i]], out[i], None if weights is None else weights[i])
+            return out
+
+        for start in range(0, imgs.shape[0], block_samples):
+            block = slice(start, start + block_samples)
+            weight = None if weights is None else weights[block, np.newaxis, np.newaxis, np.newaxis]
+            self.__mix_block(imgs[block], imgs[permutation[block]], out[block], weight)
+        return out
+
+
+    def __get_rows(self, img, rows:slice, out:np.ndarray):
+        '''
+        Returns the rows of img that belong to the rows of out. Scalars and
+        broadcast arrays are returned as they are.
+        '''
+        if isinstance(img, np.ndarray) and img.ndim == out.ndim and img.shape[0] == out.shape[0]:
+            return img[rows]
+        return img
+
 
+    def __mix_block(self, img_1, img_2, out:np.ndarray, weight=None) -> np.ndarray:
+        # a given weight always mixes relatively
+        method = self.method if weight is None else 'rel'
+        weight = self.value if weight is None else weight
 
-    def augment(self, img:np.ndarray) -> np.ndarray:
+        if self.blending == 'fixed':
+            if method == 'avg':
+                return self.__avg_fixed(img_1, img_2, out)
+            elif method == 'rel':
+                return self.__rel_fixed(img_1, img_2, out, weight)
+
+        if method == 'avg':
+            return self.__avg(img_1, img_2, out)
+        elif method == 'rel':
+            return self.__rel(img_1, img_2, out, weight)
+
+
+    def augment(self, img:np.ndarray, index:int=None, out:np.ndarray=None) -> np.ndarray:
         '''
         Contoller for augmentation of the given image.
+        Images of different shape are mixed on a canvas of shape
+            (max(img[y], mix_img[y]), max(img[x], mix_img[x]), 3)
+        where added areas contain solely white pixels.
+        Returns the mixed image as int32 np.ndarray, or uint8 with fixed blending.
+        Weighted sums are computed in blocks of rows, so apart from the output only
+        temporaries of a few BLOCK_SIZE bytes are allocated once mix_img is cached.
+        Partners from the mix bank are padded to the canvas on every call.
         params:
             img: Image to be augmented
+            index: Index of the mixing partner in the mix bank. If no mix_img
+                is set, a random partner is drawn from the bank by default.
+            out: Optional buffer of the output shape to write the mixed image into
         '''
+        if index is not None or self.mix_img is None:
+            partner = self.__draw_partner(index)
+            shape = (max(img.shape[0], partner.shape[0]), max(img.shape[1], partner.shape[1]))
+            mix_img = self.__pad(partner, shape)
+        else:
+            shape = (max(img.shape[0], self.mix_img.shape[0]), max(img.shape[1], self.mix_img.shape[1]))
+            mix_img = self.__get_mix_img(shape)
 
-        # reshape images if necessary
-        if img.shape != self.mix_img.shape:
-            img, self.mix_img = self.__reshape(img, self.mix_img)
+        if self.blending == 'fixed' and (img.dtype != np.uint8 or mix_img.dtype != np.uint8):
+            raise ValueError('Fixed blending requires uint8 images.')
+        if out is None:
+            out = np.empty(shape + img.shape[2:], dtype=np.uint8 if self.blending == 'fixed' else np.int32)
 
-        # mix images
-        if self.method == 'avg':
-            img = self.__avg(img, self.mix_img)
+        # no padding needed
+        if img.shape[:2] == shape:
+            return self.__mix(img, mix_img, out)
 
-        elif self.method == 'rel':
-            img = self.__rel(img, self.mix_img)
-        
-        return img
\ No newline at end of file
+        # mix white background first, then the region of the image
+        top = (shape[0] - img.shape[0]) // 2
+        left = (shape[1] - img.shape[1]) // 2
+        region = (slice(top, top + img.shape[0]), slice(left, left + img.shape[1]))
+
+        self.__mix(self.FILL_VALUE, mix_img, out)
+        self.__mix(img, mix_img[region], out[region])
+        return out
+
+
+    def augment_batch(self, imgs:np.ndarray, alpha:float=None, permutation:np.ndarray=None, out:np.ndarray=None) -> tuple:
+        '''
+        Mixes every image of a batch of shape (N, H, W, C) with a partner from the same batch.
+        Partners are given by a random permutation of the batch, so neither mix_img
+        nor mix_bank is needed.
+        Returns the tuple (mixed images, permutation, weights). Image i is weighted
+        weights[i] times and its partner permutation[i] is weighted 1 - weights[i] times.
+        Pairs are mixed in blocks of samples or rows, so apart from the output only
+        temporaries of a few BLOCK_SIZE bytes are allocated.
+        params:
+            imgs: Images to be augmented
+            alpha: If given, per-sample weights are drawn from Beta(alpha, alpha) as in mixup.
+                Otherwise all images use the value of the method.
+            permutation: Partner index for every image. Drawn at random if None.
+            out: Optional buffer of the batch shape to write the mixed images into
+        '''
+        if imgs.ndim != 4:
+            raise ValueError('Batch must be of shape (N, H, W, C)')
+        if self.blending == 'fixed' and imgs.dtype != np.uint8:
+            raise ValueError('Fixed blending requires uint8 images.')
+
+        count = imgs.shape[0]
+        if permutation is None:
+            permutation = self.rng.permutation(count)
+        if alpha is None:
+            weights = np.full(count, self.value)
+        else:
+            weights = self.rng.beta(alpha, alpha, count)
+
+        if out is None:
+            out = np.empty(imgs.shape, dtype=np.uint8 if self.blending == 'fixed' else np.int32)
+
+        # mixup weights every pair, avg without alpha keeps its method
+        self.__mix_batch(imgs, permutation, out, None if self.method == 'avg' and alpha is None else weights)
+        return out, permutation, weights
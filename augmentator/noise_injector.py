@@ -1,6 +1,8 @@
 import numpy as np
 
-class Noise_Injector():
+from augmentator import seeding
+
+class Noise_Injector(seeding.Randomized):
     '''
     Class to inject noise to images.
     Noise can be either gaussian or salt_and_pepper.
@@ -9,12 +11,36 @@ class Noise_Injector():
         method: specifiy type of noise to be injected.
             valid values are either gauss or salt_pepper.
         value: intensity of imputed noise.
+        precision: engine used for gaussian noise. Possible values:
+            float64: float64 samples, returns int32
+            float32: float32 samples, added and clipped in blocks of rows and written as uint8
+        bit_generator: bit generator of the random generator. Possible values:
+            PCG64, Philox, SFC64, MT19937
+        texture_size: side length of a precomputed noise texture used by the float32 engine.
+            Images get a crop of the texture at a random offset and with random flips,
+            wrapping around its borders. 0 draws fresh noise for every image.
+        seed: seed of the random generator. None, an int, a SeedSequence or a np.random.Generator.
+        sampling: how salt and pepper pixels are chosen. Possible values:
+            unique: exactly the configured number of distinct pixels per image
+            bernoulli: every pixel independently, with the configured number in expectation
+        inplace: salt_pepper writes into the given image if True, into a copy otherwise.
+            A given out buffer always takes precedence.
     '''
-    def __init__(self, method:str='gauss', value:float=0.5) -> None:
+    def __init__(self, method:str='gauss', value:float=0.5, precision:str='float64', bit_generator:str='PCG64', texture_size:int=0, seed=None, sampling:str='unique', inplace:bool=True) -> None:
         self.METHODS = ['gauss', 'salt_pepper']
+        self.PRECISIONS = ['float64', 'float32']
+        self.SAMPLINGS = ['unique', 'bernoulli']
+        self.BIT_GENERATORS = ['PCG64', 'Philox', 'SFC64', 'MT19937']
+        self.BLOCK_SIZE = 1 << 16
 
         self.set_method(method)
         self.set_value(value)
+        self.set_precision(precision)
+        self.seed = seed
+        self.set_bit_generator(bit_generator)
+        self.set_texture_size(texture_size)
+        self.set_sampling(sampling)
+        self.set_inplace(inplace)
 
 
     def __repr__(self) -> str:
@@ -48,50 +74,222 @@ class Noise_Injector():
             print(f'Value set to default: {self.value}')
 
 
-    def __gauss_noise(self, img:np.ndarray) -> np.ndarray:
+    def set_precision(self, precision:str) -> None:
+        if precision in self.PRECISIONS:
+            self.precision = precision
+        else:
+            self.precision = 'float64'
+            print('Invalid precision entered.')
+            print(f'Precision set to default: {self.precision}')
+
+
+    def set_sampling(self, sampling:str) -> None:
+        if sampling in self.SAMPLINGS:
+            self.sampling = sampling
+        else:
+            self.sampling = 'unique'
+            print('Invalid sampling entered.')
+            print(f'Sampling set to default: {self.sampling}')
+
+
+    def set_inplace(self, inplace:bool) -> None:
+        self.inplace = inplace
+
+
+    def set_bit_generator(self, bit_generator:str) -> None:
+        if bit_generator in self.BIT_GENERATORS:
+            self.bit_generator = bit_generator
+        else:
+            self.bit_generator = 'PCG64'
+            print('Invalid bit generator entered.')
+            print(f'Bit generator set to default: {self.bit_generator}')
+        self.set_rng(self.seed)
+
+
+    def set_rng(self, seed) -> None:
+        '''
+        Sets the random generator. The noise texture is recreated from the new generator.
+        params:
+            seed: None, an int, a SeedSequence or a np.random.Generator.
+        '''
+        super().set_rng(seed)
+        self.__texture = None
+
+
+    def set_texture_size(self, texture_size:int) -> None:
+        if texture_size >= 0:
+            self.texture_size = texture_size
+        else:
+            self.texture_size = 0
+            print('Invalid texture size entered. Size must not be negative.')
+            print(f'Texture size set to default: {self.texture_size}')
+        self.__texture = None
+
+
+    def __gauss_noise(self, img:np.ndarray, out:np.ndarray=None) -> np.ndarray:
         '''
         Impute gaussian noise in images in np.ndarray type.
             1. create gaussian noise with image dimensions.
             2. add noise to image.
             3. clip image values to [0, 255]
         '''
+        if self.precision == 'float32':
+            return self.__gauss_noise_float32(img, out)
+
         # TODO: find good values for noise strength (mean and sigma)
         mean = 30 * self.value
         sigma = 20 * self.value
-        gauss = np.random.normal(mean, sigma, img.shape)
+        gauss = self.rng.normal(mean, sigma, img.shape)
 
         img = img + gauss
 
         img = np.clip(img, 0, 255)
 
-        return img.astype(np.int32)
+        return self.__write(img.astype(np.int32), out)
+
+
+    def __gauss_noise_float32(self, img:np.ndarray, out:np.ndarray=None) -> np.ndarray:
+        '''
+        Impute gaussian noise with the float32 engine.
+        Noise is drawn (or sampled from the texture), scaled, added and clipped
+        in blocks of rows that fit into the cache, then written as uint8.
+        '''
+        mean = np.float32(30 * self.value)
+        sigma = np.float32(20 * self.value)
+
+        if out is None:
+            out = np.empty(img.shape, dtype=np.uint8)
+
+        rows, cols = img.shape[0], img.shape[1]
+        block_rows = max(1, self.BLOCK_SIZE // (img[0].size or 1))
+        texture_rows, texture_cols = self.__sample_texture(img) if self.texture_size > 0 else (None, None)
 
+        for start in range(0, rows, block_rows):
+            end = min(rows, start + block_rows)
+            if texture_rows is None:
+                noise = self.rng.standard_normal((end - start,) + img.shape[1:], dtype=np.float32)
+            else:
+                noise = self.__texture[texture_rows[start:end, np.newaxis], texture_cols]
+            noise *= sigma
+            noise += mean
+            noise += img[start:end]
+            np.clip(noise, 0, 255, out=noise)
+            np.copyto(out[start:end], noise, casting='unsafe')
 
-    def __salt_pepper_noise(self, img:np.ndarray) -> np.ndarray:
+        return out
+
+
+    def __sample_texture(self, img:np.ndarray) -> tuple:
+        '''
+        Returns row and column indices of a randomly placed and flipped crop of the
+        noise texture. The texture is created on first use and wraps around its borders.
+        params:
+            img: Image the crop is sampled for
+        '''
+        texture_shape = (self.texture_size, self.texture_size) + img.shape[2:]
+        if self.__texture is None or self.__texture.shape != texture_shape:
+            self.__texture = self.rng.standard_normal(texture_shape, dtype=np.float32)
+
+        offset_y, offset_x = self.rng.integers(0, self.texture_size, 2)
+        flip_y, flip_x = self.rng.integers(0, 2, 2)
+
+        texture_rows = (offset_y + np.arange(img.shape[0])) % self.texture_size
+        texture_cols = (offset_x + np.arange(img.shape[1])) % self.texture_size
+        if flip_y:
+            texture_rows = texture_rows[::-1]
+        if flip_x:
+            texture_cols = texture_cols[::-1]
+
+        return texture_rows, texture_cols
+
+
+    def __write(self, img:np.ndarray, out:np.ndarray=None) -> np.ndarray:
+        '''
+        Writes the result into out if a buffer is given.
+        '''
+        if out is None:
+            return img
+        out[...] = img
+        return out
+
+
+    def __salt_pepper_noise(self, img:np.ndarray, out:np.ndarray=None) -> np.ndarray:
         '''
         Impute salt_and_pepper noise in images in np.ndarray type.
             1. determine amount of noise.
-            2. determine random spots for white (salt) pixels and impute.
-            3. determine random spots for black (pepper) pixels and impute.
+            2. determine random spots for white (salt) and black (pepper) pixels in one draw.
+            3. impute salt and pepper.
         '''
+        return self.__salt_pepper_batch(img[np.newaxis], None if out is None else out[np.newaxis])[0]
+
+
+    def __salt_pepper_batch(self, imgs:np.ndarray, out:np.ndarray=None) -> np.ndarray:
+        '''
+        Impute salt_and_pepper noise in every image of a batch.
+        Salt and pepper pixels never collide and may lie anywhere in the image.
+        params:
+            imgs: Batch of shape (N, H, W) or (N, H, W, C)
+            out: Optional buffer of the shape of imgs
+        '''
+        if out is not None:
+            np.copyto(out, imgs, casting='unsafe')
+            imgs = out
+        elif not self.inplace:
+            imgs = imgs.copy()
+
+        count, height, width = imgs.shape[:3]
+        pixels = height * width
+
+        # number of salt and of pepper pixels per image
         amount = self.value / 100
+        num_salt = min(int(np.ceil(amount * imgs[0].size * 0.5)), pixels // 2)
+        if num_salt == 0:
+            return imgs
 
-        # salt
-        num_salt = np.ceil(amount * img.size * 0.5)
-        coords = [np.random.randint(0, i-1, int(num_salt)) for i in img.shape[:2]]
-        img[tuple(coords)] = 255
+        if self.sampling == 'bernoulli':
+            draw = self.rng.random((count, height, width), dtype=np.float32)
+            probability = num_salt / pixels
+            imgs[draw < probability] = 255
+            imgs[draw >= 1 - probability] = 0
+            return imgs
 
-        # pepper
-        num_pepper = np.ceil(amount * img.size * 0.5)
-        coords = [np.random.randint(0, i-1, int(num_pepper)) for i in img.shape[:2]]
-        img[tuple(coords)] = 0
+        if count == 1:
+            indices = self.rng.choice(pixels, 2 * num_salt, replace=False)[np.newaxis]
+        else:
+            # the smallest keys of uniform random keys are unique per image
+            keys = self.rng.random((count, pixels), dtype=np.float32)
+            indices = np.argpartition(keys, 2 * num_salt - 1, axis=1)[:, :2 * num_salt]
 
-        return img
+        batch = np.arange(count)[:, np.newaxis]
+        ys, xs = np.divmod(indices, width)
+        imgs[batch, ys[:, :num_salt], xs[:, :num_salt]] = 255
+        imgs[batch, ys[:, num_salt:], xs[:, num_salt:]] = 0
+        return imgs
 
 
-    def augment(self, img:np.ndarray) -> np.ndarray:
+    def augment(self, img:np.ndarray, out:np.ndarray=None) -> np.ndarray:
         '''
         Takes an image in np.ndarray type as input.
         Returns a noise_injected image with specified noise method in np.ndarray type.
+        params:
+            img: Image to be augmented
+            out: Optional buffer of the shape of img to write the result into
         '''
-        return self.__method(img)
+        return self.__method(img, out)
+
+
+    def augment_batch(self, imgs:np.ndarray, out:np.ndarray=None) -> np.ndarray:
+        '''
+        Augments a batch of images. salt_pepper noise is drawn for all images at once.
+        params:
+            imgs: Batch of images of shape (N, H, W, C)
+            out: Optional buffer of the shape of imgs to write the result into
+        '''
+        if imgs.ndim != 4:
+            raise ValueError('Batch must be of shape (N, H, W, C)')
+
+        if self.method == 'salt_pepper':
+            return self.__salt_pepper_batch(imgs, out)
+
+        results = [self.__gauss_noise(img, None if out is None else out[i]) for i, img in enumerate(imgs)]
+        return out if out is not None else np.stack(results)
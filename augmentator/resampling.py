@@ -0,0 +1,156 @@
+'''
+Helpers for inverse-mapping resampling of images.
+Geometric augmentations describe for every output pixel where to read from
+in the source image. These source coordinates are turned into an index map
+which is gathered from the source in a single fancy-indexing pass.
+Index maps address a source image that is padded by one pixel of fill value,
+so that pixels mapped outside of the source are filled without any masking.
+'''
+
+import numpy as np
+
+
+INTERPOLATIONS = ['nearest', 'bilinear']
+
+
+def source_coordinates(out_shape:tuple, matrix:np.ndarray) -> tuple:
+    '''
+    Calculates the source coordinates for every pixel of an output grid.
+    params:
+        out_shape: (height, width) of the output grid
+        matrix: 3x3 affine matrix mapping homogeneous output (x, y, 1) to source coordinates
+    '''
+    xs = np.arange(out_shape[1], dtype=np.float64)[np.newaxis, :]
+    ys = np.arange(out_shape[0], dtype=np.float64)[:, np.newaxis]
+
+    src_x = matrix[0, 0] * xs + matrix[0, 1] * ys + matrix[0, 2]
+    src_y = matrix[1, 0] * xs + matrix[1, 1] * ys + matrix[1, 2]
+
+    return src_y, src_x
+
+
+def index_map(src_y:np.ndarray, src_x:np.ndarray, src_shape:tuple, interpolation:str='nearest', dtype=np.int32) -> tuple:
+    '''
+    Converts source coordinates into indices of the padded source image.
+    Returns (ys, xs, wy, wx). For nearest interpolation the weights are None,
+    for bilinear interpolation ys and xs address the top left neighbour.
+    params:
+        src_y, src_x: source coordinates as calculated by source_coordinates
+        src_shape: (height, width) of the unpadded source image
+        interpolation: nearest or bilinear
+        dtype: integer type used to store the indices
+    '''
+    height, width = src_shape[0], src_shape[1]
+
+    # shift into padded coordinates and clamp onto the fill border
+    src_y = np.clip(src_y + 1, 0, height + 1)
+    src_x = np.clip(src_x + 1, 0, width + 1)
+
+    if interpolation == 'nearest':
+        ys = np.rint(src_y).astype(dtype)
+        xs = np.rint(src_x).astype(dtype)
+        return ys, xs, None, None
+
+    # top left neighbour and distance to it
+    ys = np.minimum(np.floor(src_y), height)
+    xs = np.minimum(np.floor(src_x), width)
+    wy = (src_y - ys).astype(np.float32)
+    wx = (src_x - xs).astype(np.float32)
+
+    return ys.astype(dtype), xs.astype(dtype), wy, wx
+
+
+def pad(img:np.ndarray, fill_value=255) -> np.ndarray:
+    '''
+    Adds a one pixel border of fill_value around an image (or batch of images).
+    params:
+        img: Image of shape (H, W, C) or batch of shape (N, H, W, C)
+        fill_value: Value of the border pixels
+    '''
+    pad_width = [(1, 1), (1, 1), (0, 0)]
+    if img.ndim == 4:
+        pad_width = [(0, 0)] + pad_width
+    return np.pad(img, pad_width, mode='constant', constant_values=fill_value)
+
+
+def gather(img:np.ndarray, indices:tuple, fill_value=255, out:np.ndarray=None) -> np.ndarray:
+    '''
+    Gathers the pixels addressed by an index map from an image.
+    params:
+        img: Source image of shape (H, W, C)
+        indices: Index map as returned by index_map
+        fill_value: Value for pixels mapped outside of the source image
+        out: Optional buffer to write the result into
+    '''
+    return _sample(pad(img, fill_value), (), indices, out)
+
+
+def gather_batch(imgs:np.ndarray, indices:tuple, fill_value=255, out:np.ndarray=None) -> np.ndarray:
+    '''
+    Gathers the pixels addressed by an index map shared by all images of a batch.
+    params:
+        imgs: Source images of shape (N, H, W, C)
+        indices: Index map as returned by index_map
+        fill_value: Value for pixels mapped outside of the source images
+        out: Optional buffer to write the result into
+    '''
+    return sample_batch(pad(imgs, fill_value), indices, out)
+
+
+def sample_batch(padded:np.ndarray, indices:tuple, out:np.ndarray=None, samples=None) -> np.ndarray:
+    '''
+    Samples images of a padded batch with a shared index map, so batches with
+    several maps are padded only once. Images are sampled one at a time straight
+    into out, which keeps the temporaries of bilinear sampling at the size of one image.
+    params:
+        padded: Padded source images of shape (N, H + 2, W + 2, C)
+        indices: Index map as returned by index_map
+        out: Optional buffer to write the result into
+        samples: Indices of the images to sample. Only these images of out are written.
+    '''
+    if out is None:
+        out_shape = np.broadcast_shapes(indices[0].shape, indices[1].shape)
+        out = np.empty((padded.shape[0],) + out_shape + padded.shape[3:], dtype=padded.dtype)
+    for i in range(padded.shape[0]) if samples is None else samples:
+        _sample(padded[i], (), indices, out[i])
+    return out
+
+
+def sample(img:np.ndarray, indices:tuple, out:np.ndarray=None) -> np.ndarray:
+    '''
+    Samples an image with an index map that addresses the image itself instead of
+    its padded version. Index arrays may be broadcastable, e.g. (H, 1) rows and
+    (1, W) columns for separable maps.
+    params:
+        img: Source image of shape (H, W, C)
+        indices: Index map (ys, xs, wy, wx). Bilinear maps must keep ys + 1 and xs + 1 inside the image.
+        out: Optional buffer to write the result into
+    '''
+    return _sample(img, (), indices, out)
+
+
+def _sample(padded:np.ndarray, batch:tuple, indices:tuple, out:np.ndarray=None) -> np.ndarray:
+    '''
+    Samples a padded image or batch. batch is prepended to every index tuple.
+    '''
+    ys, xs, wy, wx = indices
+
+    if wy is None:
+        result = padded[batch + (ys, xs)]
+    else:
+        wy = wy[..., np.newaxis]
+        wx = wx[..., np.newaxis]
+        top = padded[batch + (ys, xs)] * (1 - wx) + padded[batch + (ys, xs + 1)] * wx
+        bottom = padded[batch + (ys + 1, xs)] * (1 - wx) + padded[batch + (ys + 1, xs + 1)] * wx
+        result = top * (1 - wy) + bottom * wy
+
+        # round back onto the grid of integer images
+        if np.issubdtype(padded.dtype, np.integer):
+            info = np.iinfo(padded.dtype)
+            result = np.clip(np.rint(result), info.min, info.max)
+
+    if out is None:
+        return result.astype(padded.dtype, copy=False)
+
+    out[...] = result
+    return out
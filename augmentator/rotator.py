@@ -1,7 +1,8 @@
-# TODO: tests
-
 import numpy as np
 
+from augmentator import resampling
+from augmentator.lru_cache import LRUCache
+
 class Rotator():
     '''
     Rotator carries out a rotation of images with specified angle and pivot-point.
@@ -13,18 +14,36 @@ class Rotator():
         pivot_point: specifies center of rotation as tuple. Must be a relative 
                 value from 0 to 100. Example (50, 50) for selection of the center.
         anti-aliasing: specifies wether anti-aliasing is used to reduce/prevent
-                fragmentation of the image. Can only be used with method "center"
+                fragmentation of the image. Anti-aliasing uses bilinear interpolation
+                instead of nearest neighbour. With method "center" the canvas is
+                expanded such that the whole rotated image fits.
+        cache_size: number of source index maps kept in a LRU cache. Maps are keyed by
+                image shape, angle, pivot-point and method. 0 disables caching.
+        index_dtype: integer type of cached index maps. Possible values:
+                int32: supports any image size
+                int16: halves the memory of cached maps, for images up to 32765 pixels per side
+    Rotations by exact multiples of 90 degrees return views of the input with exact
+    dimensions wherever possible. After every augmentation is_view tells whether
+    the result is a view of the input or a copy.
     '''
 
-    def __init__(self, method:str='center', angle:int=90, pivot_point:tuple=None, anti_aliasing:bool=True) -> None:
+    def __init__(self, method:str='center', angle:int=90, pivot_point:tuple=None, anti_aliasing:bool=True, cache_size:int=8, index_dtype:str='int32') -> None:
         # constants
         self.METHODS = ['center', 'point']
+        self.INDEX_DTYPES = ['int32', 'int16']
+        self.CANVASES = ['same', 'expand']
+        self.FILL_VALUE = 255
+
+        # cache of source index maps
+        self.cache = LRUCache(cache_size)
+        self.is_view = False
 
         # setter
         self.set_method(method)
         self.set_anti_aliasing(anti_aliasing)
         self.set_angle(angle)
         self.set_pivot_point(pivot_point)
+        self.set_index_dtype(index_dtype)
 
 
     def set_method(self, method:str) -> None:
@@ -37,15 +56,8 @@ class Rotator():
 
 
     def set_anti_aliasing(self, anti_aliasing:bool) -> None:
-        if anti_aliasing and self.method == 'center':
-            self.anti_aliasing = anti_aliasing
-        elif not anti_aliasing:
-            self.anti_aliasing = anti_aliasing
-        else:
-            self.anti_aliasing = False
-            print('Error while setting anti_aliasing')
-            print('anti_aliasing can only be used with method "center"')
-            print(f'anti_aliasing set to {self.anti_aliasing}')
+        self.anti_aliasing = anti_aliasing
+        self.interpolation = 'bilinear' if anti_aliasing else 'nearest'
 
 
     def set_angle(self, angle:int) -> None:
@@ -69,132 +81,257 @@ class Rotator():
                 print(f'Change method to: {self.method}')
 
 
-    def __rotate_center_anti_aliasing(self, img:np.ndarray) -> np.ndarray:
-        '''
-        Image will be rotated around its center.
-        Shearing is used for anti-aliasing in order to prevent fragments.
-        params:
-            img: Image to rotate 
-        '''
-        # calculate important constants for rotation process
-        angle = np.radians(self.angle)
-        cosine = np.cos(angle)
-        sine = np.sin(angle)
-        width = img.shape[1]
-        height = img.shape[0]
-
-        # calculate new dimensions
-        new_height = round(abs(height * cosine) + abs(width * sine)) + 1
-        new_width = round(abs(width * cosine) + abs(height * sine)) + 1
-
-        # initialize new image
-        new_img = np.zeros((new_height, new_width, img.shape[2]))
-        new_img[:, :, :] = 255
+    def set_cache_size(self, cache_size:int) -> None:
+        self.cache.set_maxsize(cache_size)
 
-        # calculate old and new coordinates of image center
-        original_centre_height = round(((height + 1) / 2) - 1)
-        original_centre_width = round(((width + 1) / 2) - 1)
-        new_centre_height= round(((new_height + 1) / 2) - 1)
-        new_centre_width= round(((new_width + 1) / 2) - 1)
 
-        # calculate new position for every pixel
-        for h in range(height):
-            for w in range(width):
-                y = height - 1 - h - original_centre_height
-                x = width - 1 - w - original_centre_width
+    def set_index_dtype(self, index_dtype:str) -> None:
+        if index_dtype in self.INDEX_DTYPES:
+            self.index_dtype = index_dtype
+        else:
+            self.index_dtype = 'int32'
+            print('Input for index_dtype is unknown')
+            print(f'Use default index_dtype: {self.index_dtype}')
+        self.cache.clear()
 
-                new_x, new_y = self.__shear(angle, x, y)
 
-                new_y = new_centre_height - new_y
-                new_x = new_centre_width - new_x
+    def __get_pivot_coordinates(self, shape:tuple) -> tuple:
+        '''
+        Calculates the coordinates of the pivot point for rotation.
+        params:
+            shape: Shape of the image whiches pivot coordinates are calculated
+        '''
+        width, height = shape[1], shape[0]
+        if self.method == 'center':
+            return ((width - 1) / 2, (height - 1) / 2)
+        else:
+            return (int(width * (self.pivot_point_x / 100)), int(height * (self.pivot_point_y / 100)))
 
-                new_img[new_y, new_x, :] = img[h, w, :]
 
-        return new_img.astype(np.uint8)
+    def __get_expanded_shape(self, shape:tuple, angle:float) -> tuple:
+        '''
+        Calculates the dimensions of a canvas that fits the whole rotated image.
+        params:
+            shape: Shape of the image to rotate
+            angle: Angle of rotation (in degrees)
+        '''
+        angle = np.radians(angle)
+        cosine = abs(np.cos(angle))
+        sine = abs(np.sin(angle))
+        new_height = round(shape[0] * cosine + shape[1] * sine) + 1
+        new_width = round(shape[1] * cosine + shape[0] * sine) + 1
+        return (new_height, new_width)
 
 
-    def __rotate_aliasing(self, img:np.ndarray) -> np.ndarray:
+    def __get_output_shape(self, shape:tuple) -> tuple:
         '''
-        Rotates an image by using a rotation matrix.
-        Rotation is carried out around a pivot-point specified as attribute.
-        Image will be fragmented beacuse of aliasing.
+        Calculates the dimensions of the rotated image.
+        Rotation around the center with anti-aliasing expands the canvas
+        such that the whole rotated image fits, otherwise the shape is kept.
         params:
-            img: Image to rotate
+            shape: Shape of the image to rotate
         '''
-        # create a rotation matrix
-        angle = np.radians(self.angle)
-        rotation_matrix = np.transpose(np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]]))
-
-        # store important values
-        w, h = img.shape[1], img.shape[0]
-        pivot_point_x, pivot_point_y = self.__get_pivot_coordinates(img)
+        if self.anti_aliasing and self.method == 'center':
+            return self.__get_expanded_shape(shape, self.angle)
+        return (shape[0], shape[1])
 
-        # initialize new image
-        new_img = np.zeros(img.shape, dtype='u1')
-        new_img[:, :, :] = 255
 
-        # calculate new position for every pixel
-        for height in range(h):
-            for width in range(w):
-                xy_matrix = np.array([[width - pivot_point_x], [height - pivot_point_y]])
+    def __get_inverse_matrix(self, shape:tuple, angle:float, out_shape:tuple) -> np.ndarray:
+        '''
+        Creates the affine matrix mapping output pixels back onto the source.
+        The rotation is clockwise. On a canvas of the same shape the pivot stays
+        in place, on any other canvas the image center is moved onto the canvas center.
+        params:
+            shape: Shape of the image to rotate
+            angle: Angle of rotation (in degrees)
+            out_shape: Shape of the output canvas
+        '''
+        angle = np.radians(angle)
+        cosine, sine = np.cos(angle), np.sin(angle)
 
-                rotate_matrix = np.dot(rotation_matrix, xy_matrix)
+        if (out_shape[0], out_shape[1]) == (shape[0], shape[1]):
+            pivot_x, pivot_y = self.__get_pivot_coordinates(shape)
+            out_pivot_x, out_pivot_y = pivot_x, pivot_y
+        else:
+            pivot_x, pivot_y = (shape[1] - 1) / 2, (shape[0] - 1) / 2
+            out_pivot_x, out_pivot_y = (out_shape[1] - 1) / 2, (out_shape[0] - 1) / 2
 
-                new_x = pivot_point_x + int(rotate_matrix[0])
-                new_y = pivot_point_y + int(rotate_matrix[1])
+        # transposed rotation matrix inverts the rotation
+        rotation = np.array([[cosine, sine], [-sine, cosine]])
+        offset = np.array([pivot_x, pivot_y]) - rotation @ np.array([out_pivot_x, out_pivot_y])
 
-                if (0 <= new_x <= w - 1) and (0 <= new_y <= h - 1):
-                    new_img[new_y, new_x] = img[height, width]
-        
-        return new_img
+        matrix = np.eye(3)
+        matrix[:2, :2] = rotation
+        matrix[:2, 2] = offset
+        return matrix
 
 
-    def __get_pivot_coordinates(self, img:np.ndarray) -> tuple:
+    def __get_quarter_turns(self, shape:tuple, angle:float, expand:bool):
         '''
-        Calculates the coordinates of the pivot point for rotation.
+        Returns the number of clockwise quarter turns if the rotation is exactly
+        a right angle rotation of the whole image, otherwise None.
         params:
-            img: Image whiches pivot coordainates are calculated
+            shape: Shape of the image to rotate
+            angle: Angle of rotation (in degrees)
+            expand: Whether the canvas fits the whole rotated image
         '''
-        width, height = img.shape[1], img.shape[0]
-        if self.method == 'center':
-            return (int(width / 2), int(height / 2))
-        else:
-            return (int(width * (self.pivot_point_x / 100)), int(height * (self.pivot_point_y / 100)))
+        if angle % 90 != 0:
+            return None
+        turns = int(angle // 90) % 4
+        if turns == 0:
+            return turns
+        # only the center is a pivot for which quarter turns keep the image on the grid
+        if self.method != 'center':
+            return None
+        if turns == 2 or expand or shape[0] == shape[1]:
+            return turns
+        return None
+
+
+    def __get_index_map(self, shape:tuple, angle:float, out_shape:tuple, cache:bool=True) -> tuple:
+        '''
+        Returns the source indices for every pixel of the rotated image.
+        Index maps are looked up in the cache and only computed on a miss.
+        params:
+            shape: Shape of the image to rotate
+            angle: Angle of rotation (in degrees)
+            out_shape: Shape of the output canvas
+            cache: Use the cache. Batches with more angles than the cache holds
+                   compute their maps directly instead of evicting all entries.
+        '''
+        if not cache:
+            return self.__compute_index_map(shape, angle, out_shape)
+
+        pivot = (self.pivot_point_x, self.pivot_point_y) if self.method == 'point' else None
+        key = (shape[0], shape[1], angle, pivot, self.method, self.interpolation, out_shape)
 
+        indices = self.cache.get(key)
+        if indices is None:
+            indices = self.__compute_index_map(shape, angle, out_shape)
+            for array in indices:
+                if array is not None:
+                    array.flags.writeable = False
+            self.cache.put(key, indices)
+        return indices
 
-    def __shear(self, angle, x, y):
+
+    def __compute_index_map(self, shape:tuple, angle:float, out_shape:tuple) -> tuple:
         '''
-        Calculate new pixel-coordinates for anti-aliasing with shearing.
-        Prevents fragmentation. Only applicable for center-rotation.
+        Computes the source indices for every pixel of the rotated image.
         params:
-            angle: Angle of the rotation.
-            x: x-coordinate of pixel
-            y: y-coordinate of pixel
+            shape: Shape of the image to rotate
+            angle: Angle of rotation (in degrees)
+            out_shape: Shape of the output canvas
         '''
-        # shear 1
-        tangent = np.tan(angle / 2)
-        new_x = round(x - y * tangent)
-        new_y = y
+        # indices address the padded image, int16 is only possible for small images
+        dtype = np.dtype(self.index_dtype)
+        if max(shape[0], shape[1]) + 2 > np.iinfo(dtype).max:
+            dtype = np.dtype(np.int32)
 
-        # shear 2
-        new_y = round(new_x * np.sin(angle) + new_y)
+        matrix = self.__get_inverse_matrix(shape, angle, out_shape)
+        src_y, src_x = resampling.source_coordinates(out_shape, matrix)
+        return resampling.index_map(src_y, src_x, shape, self.interpolation, dtype)
 
-        # shear 3
-        new_x = round(new_x - new_y * tangent)
 
-        return new_x, new_y
+    def get_transform(self, shape:tuple) -> tuple:
+        '''
+        Returns the rotation as affine matrix mapping output (x, y, 1) to source
+        coordinates, together with the output shape (H, W).
+        Right angle rotations get the exact rotated shape like in augment.
+        params:
+            shape: Shape of the image to rotate
+        '''
+        expand = self.anti_aliasing and self.method == 'center'
+        turns = self.__get_quarter_turns(shape, self.angle, expand)
+        if turns is not None:
+            out_shape = (shape[1], shape[0]) if turns % 2 else (shape[0], shape[1])
+        else:
+            out_shape = self.__get_output_shape(shape)
+        return self.__get_inverse_matrix(shape, self.angle, out_shape), out_shape
 
 
     def augment(self, img:np.ndarray) -> np.ndarray:
         '''
         Contoller for augmentation of the given image.
+        Every output pixel is mapped back onto the source image in one vectorized pass.
+        Repeated shapes and angles reuse a cached index map, so rotating is a single gather.
+        Right angle rotations return a view of img.
         params:
             img: Image to be augmented
         '''
+        expand = self.anti_aliasing and self.method == 'center'
+        turns = self.__get_quarter_turns(img.shape, self.angle, expand)
+        if turns is not None:
+            self.is_view = True
+            return np.rot90(img, -turns)
 
-        if self.anti_aliasing and self.method == 'center':
-            return self.__rotate_center_anti_aliasing(img)
-        elif not self.anti_aliasing:
-            return self.__rotate_aliasing(img)
+        out_shape = self.__get_output_shape(img.shape)
+        indices = self.__get_index_map(img.shape, self.angle, out_shape)
+        self.is_view = False
+        return resampling.gather(img, indices, self.FILL_VALUE)
+
+
+    def augment_batch(self, imgs:np.ndarray, angles=None, canvas:str='same', fill_value:int=None, out:np.ndarray=None) -> np.ndarray:
+        '''
+        Rotates a stack of images of shape (N, H, W, C) in one vectorized pass.
+        All images are rotated onto a canvas of the same size, so the result can be
+        written directly into a preallocated batch.
+        Images with the same angle are gathered together with one shared index map. If all images are rotated by the
+        same right angle, a view of imgs is returned unless out is given.
+        params:
+            imgs: Images to be augmented
+            angles: Angle for all images or sequence of one angle per image (in degrees).
+                    Defaults to the angle attribute.
+            canvas: Canvas policy. Possible values:
+                    same: keep the shape of the input images
+                    expand: canvas fits every rotated image of the batch
+            fill_value: Value of pixels outside of the rotated images. Defaults to white.
+            out: Optional buffer of the output shape to write the result into
+        '''
+        if imgs.ndim != 4:
+            raise ValueError('Batch must be of shape (N, H, W, C)')
+        if canvas not in self.CANVASES:
+            raise ValueError(f'Unknown canvas policy {canvas}. Must be one of {self.CANVASES}')
+        if fill_value is None:
+            fill_value = self.FILL_VALUE
+
+        # one angle per image
+        angles = np.broadcast_to(self.angle if angles is None else angles, (imgs.shape[0],))
+        if np.any((angles < 0) | (angles > 360)):
+            raise ValueError('Illegal input for angles. Must be from 0 to 360.')
+        unique_angles, inverse = np.unique(angles, return_inverse=True)
+        shape = imgs.shape[1:]
+
+        # right angle fast path
+        if len(unique_angles) == 1:
+            turns = self.__get_quarter_turns(shape, unique_angles[0], canvas == 'expand')
+            if turns is not None:
+                rotated = np.rot90(imgs, -turns, axes=(1, 2))
+                if out is None:
+                    self.is_view = True
+                    return rotated
+                self.is_view = False
+                out[...] = rotated
+                return out
+
+        # shared output shape for the whole batch
+        if canvas == 'expand':
+            expanded = [self.__get_expanded_shape(shape, angle) for angle in unique_angles]
+            out_shape = tuple(np.max(expanded, axis=0).tolist())
         else:
-            raise(ValueError('Antialiasing can not be used with method "point"'))
\ No newline at end of file
+            out_shape = (shape[0], shape[1])
+
+        self.is_view = False
+        if len(unique_angles) == 1:
+            indices = self.__get_index_map(shape, float(unique_angles[0]), out_shape)
+            return resampling.gather_batch(imgs, indices, fill_value, out)
+
+        # images of the same angle share one map, maps are built one at a time
+        if out is None:
+            out = np.empty((imgs.shape[0],) + out_shape + shape[2:], dtype=imgs.dtype)
+        padded = resampling.pad(imgs, fill_value)
+        cache = len(unique_angles) <= self.cache.maxsize
+        for i, angle in enumerate(unique_angles):
+            indices = self.__get_index_map(shape, float(angle), out_shape, cache)
+            resampling.sample_batch(padded, indices, out, np.flatnonzero(inverse == i))
+        return out
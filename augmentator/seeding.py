@@ -0,0 +1,150 @@
+'''
+Helpers for reproducible random augmentation.
+Every random augmenter owns a np.random.Generator that is set with set_rng.
+Streams are derived from one pipeline SeedSequence by extending its spawn key,
+so they are statistically independent and do not depend on the process they
+are created in:
+    (WORKER_KEY, worker_id): stream of a worker process
+    (SAMPLE_KEY, epoch, sample_index): stream of a single sample
+Seeding per sample makes the result of a sample independent of which worker
+processes it and of the number of workers.
+Augmenters without a seed draw from OS entropy. Their generators are created
+on first use and recreated in every new process, so forked or spawned
+workers never repeat each other.
+'''
+
+import os
+
+import numpy as np
+
+
+WORKER_KEY = 0
+SAMPLE_KEY = 1
+
+
+def make_rng(seed=None, bit_generator:str='PCG64') -> np.random.Generator:
+    '''
+    Creates a random generator from a seed.
+    params:
+        seed: None for fresh OS entropy, an int, a SeedSequence or a Generator.
+              Generators are used as they are.
+        bit_generator: Name of the numpy bit generator to use
+    '''
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.Generator(getattr(np.random, bit_generator)(seed))
+
+
+class GeneratorSource():
+    '''
+    Provides the random generator of an augmenter.
+    The generator is created on first use. Without a seed it is recreated
+    whenever it is used in another process than the one it was created in,
+    e.g. after a fork or after unpickling in a worker.
+
+    params:
+        seed: None for fresh OS entropy, an int, a SeedSequence or a Generator.
+        bit_generator: Name of the numpy bit generator to use
+    '''
+    def __init__(self, seed=None, bit_generator:str='PCG64') -> None:
+        self.seed = seed
+        self.bit_generator = bit_generator
+        self.__generator = None
+        self.__pid = None
+
+
+    def __getstate__(self) -> dict:
+        # unseeded generators are never sent to other processes
+        state = {'seed': self.seed, 'bit_generator': self.bit_generator}
+        if self.seed is not None:
+            state['generator'] = self.__generator
+        return state
+
+
+    def __setstate__(self, state:dict) -> None:
+        self.seed = state['seed']
+        self.bit_generator = state['bit_generator']
+        self.__generator = state.get('generator')
+        self.__pid = os.getpid() if self.__generator is not None else None
+
+
+    def get(self) -> np.random.Generator:
+        '''
+        Returns the generator, creating it if necessary.
+        '''
+        if self.__generator is None or (self.seed is None and self.__pid != os.getpid()):
+            self.__generator = make_rng(self.seed, self.bit_generator)
+            self.__pid = os.getpid()
+        return self.__generator
+
+
+class Randomized():
+    '''
+    Base class of augmenters that draw random numbers.
+    Provides set_rng and the rng property, which returns the generator of the
+    GeneratorSource. The bit generator is taken from the bit_generator attribute.
+    '''
+    bit_generator = 'PCG64'
+
+    def set_rng(self, seed) -> None:
+        '''
+        Sets the random generator of the augmenter.
+        params:
+            seed: None, an int, a SeedSequence or a np.random.Generator.
+                  None creates a new generator from OS entropy in every process.
+        '''
+        self.seed = seed
+        self.__rng_source = GeneratorSource(seed, self.bit_generator)
+
+
+    @property
+    def rng(self) -> np.random.Generator:
+        return self.__rng_source.get()
+
+
+def derive(seed_sequence, *key) -> np.random.SeedSequence:
+    '''
+    Returns the child of a SeedSequence addressed by key.
+    Equal keys give equal children, so no state needs to be shared between processes.
+    params:
+        seed_sequence: Root SeedSequence or int entropy of the pipeline
+        key: Non-negative ints appended to the spawn key
+    '''
+    if not isinstance(seed_sequence, np.random.SeedSequence):
+        seed_sequence = np.random.SeedSequence(seed_sequence)
+    return np.random.SeedSequence(seed_sequence.entropy, spawn_key=tuple(seed_sequence.spawn_key) + tuple(int(k) for k in key), pool_size=seed_sequence.pool_size)
+
+
+def worker_seed_sequence(seed_sequence, worker_id:int) -> np.random.SeedSequence:
+    '''
+    Returns the SeedSequence of a worker process.
+    params:
+        seed_sequence: Root SeedSequence or int entropy of the pipeline
+        worker_id: Index of the worker
+    '''
+    return derive(seed_sequence, WORKER_KEY, worker_id)
+
+
+def sample_seed_sequence(seed_sequence, sample_index:int, epoch:int=0) -> np.random.SeedSequence:
+    '''
+    Returns the SeedSequence of a single sample.
+    params:
+        seed_sequence: Root SeedSequence or int entropy of the pipeline
+        sample_index: Index of the sample in the dataset
+        epoch: Index of the epoch, so samples get new randomness in every epoch
+    '''
+    return derive(seed_sequence, SAMPLE_KEY, epoch, sample_index)
+
+
+def seed_pipeline(augmenters:list, seed_sequence) -> None:
+    '''
+    Gives every random augmenter of a pipeline its own stream.
+    Augmenter i gets the child with key i, augmenters without set_rng are skipped.
+    params:
+        augmenters: Augmenters in order of application
+        seed_sequence: SeedSequence or int entropy, e.g. from worker_seed_sequence
+                       or sample_seed_sequence
+    '''
+    for i, augmenter in enumerate(augmenters):
+        if hasattr(augmenter, 'set_rng'):
+            augmenter.set_rng(derive(seed_sequence, i))
@@ -82,6 +82,26 @@ class Translator():
         return img
 
 
+    def get_transform(self, shape:tuple) -> tuple:
+        '''
+        Returns the translation as affine matrix mapping output (x, y, 1) to source
+        coordinates, together with the output shape (H, W).
+        Pixels mapped outside of the source are white, as with augment.
+        params:
+            shape: Shape of the image to translate
+        '''
+        matrix = np.eye(3)
+        if self.direction == 'up':
+            matrix[1, 2] = int(shape[0] * self.value)
+        elif self.direction == 'down':
+            matrix[1, 2] = -int(shape[0] * self.value)
+        elif self.direction == 'left':
+            matrix[0, 2] = int(shape[1] * self.value)
+        elif self.direction == 'right':
+            matrix[0, 2] = -int(shape[1] * self.value)
+        return matrix, (shape[0], shape[1])
+
+
     def augment(self, img:np.ndarray) -> np.ndarray:
         '''
         Takes an image in np.ndarray type as input.
@@ -182,6 +182,75 @@ class TestColorTransformer(unittest.TestCase):
         self.assertEqual(img[0][0][2], 255)
 
 
+    def test_lut(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        c = Color_Transformer(method='inc', value=40, channel='rg')
+
+        lut = c.compile_lut()
+        self.assertEqual(lut.shape, (3, 256))
+        self.assertEqual(lut.dtype, np.uint8)
+        self.assertEqual(lut[0][250], 255)
+        self.assertEqual(lut[1][10], 50)
+        self.assertEqual(lut[2][10], 10)
+
+        img_result = c.augment(img.copy())
+        self.assertEqual(img_result.dtype, np.uint8)
+        self.assertTrue(np.array_equal(img_result[:, :, 2], img[:, :, 2]))
+
+        # chains are fused into one table
+        chain = [c, Color_Transformer(method='max', value=200, channel='r'), Color_Transformer(method='kill', channel='g')]
+        img_chain = img.copy()
+        for transformer in chain:
+            img_chain = transformer.augment(img_chain)
+        img_fused = Color_Transformer.apply_lut(img, Color_Transformer.fuse(chain))
+        self.assertTrue(np.array_equal(img_chain, img_fused))
+
+        # identity tables only copy, out may be the image itself
+        identity = Color_Transformer().compile_lut()
+        self.assertTrue(np.array_equal(Color_Transformer.apply_lut(img, identity), img))
+        img_inplace = img.copy()
+        self.assertIs(Color_Transformer.apply_lut(img_inplace, Color_Transformer.fuse(chain), out=img_inplace, block_rows=7), img_inplace)
+        self.assertTrue(np.array_equal(img_inplace, img_fused))
+
+
+    def test_preserve_dtype(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        c = Color_Transformer(method='dec', value=25, channel='gb', is_value_percentage=True, preserve_dtype=True)
+        self.assertTrue(c.preserve_dtype)
+
+        expected = Color_Transformer(method='dec', value=25, channel='gb', is_value_percentage=True).augment(img.copy())
+        img_result = c.augment(img)
+        self.assertEqual(img_result.dtype, np.uint8)
+        self.assertTrue(np.array_equal(img_result, expected))
+
+        # other dtypes are kept as well
+        img_result = c.augment(img.astype(np.int16))
+        self.assertEqual(img_result.dtype, np.int16)
+        self.assertTrue(np.array_equal(img_result, expected))
+
+        # in place
+        img_inplace = img.copy()
+        self.assertIs(c.augment(img_inplace, out=img_inplace), img_inplace)
+        self.assertTrue(np.array_equal(img_inplace, expected))
+
+        # every value and percentage equals the default mode for integer dtypes
+        values = np.repeat(np.arange(256, dtype=np.int16).reshape(16, 16, 1), 3, axis=2)
+        for method in ['inc', 'dec']:
+            for value in range(199):
+                expected = Color_Transformer(method=method, value=value, channel='rb', is_value_percentage=True).augment(values.copy())
+                c = Color_Transformer(method=method, value=value, channel='rb', is_value_percentage=True, preserve_dtype=True)
+                for dtype in [np.uint8, np.int16, np.uint16, np.int32]:
+                    img_result = c.augment(values.astype(dtype))
+                    self.assertTrue(np.array_equal(img_result, np.clip(expected, 0, 255)), f'{method} {value} {dtype}')
+
+        # saturation
+        img = np.full((2, 2, 3), 200, dtype=np.uint16)
+        c = Color_Transformer(method='inc', value=50, channel='r', is_value_percentage=True, preserve_dtype=True)
+        img_result = c.augment(img)
+        self.assertEqual(img_result[0][0][0], 255)
+        self.assertEqual(img_result[0][0][1], 200)
+
+
 
 ### RUN
 unittest.main()
\ No newline at end of file
@@ -0,0 +1,86 @@
+import unittest
+import unittest.mock
+import io
+import numpy as np
+from PIL import Image
+
+# add folder to path to make relative imports work
+import sys,os
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+from augmentator.composer import Composer
+from augmentator.flipper import Flipper
+from augmentator.translator import Translator
+from augmentator.cropper import Cropper
+from augmentator.rotator import Rotator
+from augmentator.color_transformer import Color_Transformer
+
+
+class TestComposer(unittest.TestCase):
+
+    def chain(self, augmenters, img):
+        for augmenter in augmenters:
+            img = augmenter.augment(img.copy())
+        return img
+
+
+    def test_default_values(self):
+        c = Composer([Flipper()])
+        self.assertEqual(len(c.augmenters), 1)
+        self.assertEqual(c.interpolation, 'bilinear')
+        self.assertEqual(c.fill_value, 255)
+
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_setter(self, mock_stdout):
+        c = Composer([Flipper()], interpolation='???')
+        self.assertEqual(c.interpolation, 'bilinear')
+
+        with self.assertRaises(ValueError):
+            c.set_augmenters([Flipper(), 'rotate'])
+
+
+    def test_transforms(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        for augmenter in [Flipper('xy'), Translator('left', 0.3), Cropper(output_size=(50, 60)), Rotator(angle=30)]:
+            matrix, out_shape = augmenter.get_transform(img.shape)
+            self.assertEqual(matrix.shape, (3, 3))
+            self.assertEqual(len(out_shape), 2)
+        self.assertEqual(Rotator(angle=90).get_transform(img.shape)[1], (640, 427))
+
+
+    def test_fusion(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        chains = [
+            [Flipper('xy'), Translator('up', 0.2), Cropper(value=0.3), Rotator(angle=90)],
+            [Rotator(angle=180), Translator('right', 0.25), Cropper(value=0.5), Flipper('y')],
+            # pixels moved off an intermediate canvas stay white
+            [Rotator(angle=90), Translator('up', 0.2), Rotator(angle=270)],
+            [Rotator(angle=30, anti_aliasing=False), Translator('up', 0.3)],
+            # non geometric augmenters split the fusion
+            [Flipper('y'), Color_Transformer('kill', channel='r'), Translator('down', 0.1)],
+        ]
+        for augmenters in chains:
+            img_result = Composer(augmenters, interpolation='nearest').augment(img.copy())
+            self.assertTrue(np.array_equal(img_result, self.chain(augmenters, img)))
+
+
+    def test_cache(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        c = Composer([Flipper('x'), Rotator(angle=30)])
+
+        img_first = c.augment(img)
+        img_second = c.augment(img)
+        self.assertTrue(np.array_equal(img_first, img_second))
+        self.assertEqual((c.cache.hits, c.cache.misses), (1, 1))
+
+        # random crops are drawn for every image
+        c = Composer([Cropper('random', 0.3, seed=0, output_size=(64, 64)), Flipper()])
+        self.assertEqual(c.augment(img).shape, (64, 64, 3))
+        c.augment(img)
+        self.assertEqual(c.cache.misses, 2)
+
+
+
+### RUN
+unittest.main()
@@ -9,6 +9,8 @@ import sys,os
 BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, BASE)
 from augmentator.cropper import Cropper
+from augmentator import seeding
+from helpers import forked
 
 
 class TestCropper(unittest.TestCase):
@@ -41,6 +43,135 @@ class TestCropper(unittest.TestCase):
         self.assertNotEqual(img_orig_shape, img.shape)
 
 
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_output_size(self, mock_stdout):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        c = Cropper('random', 0.3, output_size=(64, 96))
+        img_result = c.augment(img)
+        self.assertEqual(img_result.shape, (64, 96, 3))
+        self.assertEqual(img_result.dtype, img.dtype)
+
+        # output size of the crop reproduces the crop
+        crop = Cropper().augment(img)
+        for interpolation in ['nearest', 'bilinear']:
+            c = Cropper(output_size=crop.shape[:2], interpolation=interpolation)
+            self.assertTrue(np.array_equal(c.augment(img), crop))
+
+        # upscaling by 2 with nearest interpolation repeats pixels
+        c = Cropper(value=0, output_size=(img.shape[0] * 2, img.shape[1] * 2), interpolation='nearest')
+        self.assertTrue(np.array_equal(c.augment(img), img.repeat(2, axis=0).repeat(2, axis=1)))
+
+        out = np.empty((32, 32, 3), dtype=np.uint8)
+        c = Cropper(output_size=(32, 32))
+        self.assertIs(c.augment(img, out=out), out)
+
+        # one pixel wide or tall images are resampled like their doubled pixels
+        line = np.arange(36, dtype=np.uint8).reshape(1, 12, 3)
+        c = Cropper(value=0, output_size=(4, 5))
+        self.assertTrue(np.array_equal(c.augment(line), c.augment(line.repeat(2, axis=0))))
+        column = line.reshape(12, 1, 3)
+        self.assertTrue(np.array_equal(c.augment(column), c.augment(column.repeat(2, axis=1))))
+        self.assertTrue(np.all(c.augment(line[:, :1]) == line[0, 0]))
+
+        # empty windows have no transform
+        with self.assertRaises(ValueError):
+            Cropper(value=1).get_transform(img.shape)
+
+        c.set_output_size((0, 10))
+        c.set_interpolation('???')
+        self.assertIsNone(c.output_size)
+        self.assertEqual(c.interpolation, 'bilinear')
+
+
+    def test_multi_crop(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+
+        # random crops are gathered at once
+        crops = Cropper(seed=5).multi_crop(img, 6, (100, 120))
+        boxes = Cropper(seed=5).multi_crop(img, 6, (100, 120), boxes_only=True)
+        self.assertEqual(crops.shape, (6, 100, 120, 3))
+        self.assertEqual(boxes.shape, (6, 4))
+        for crop, (u, d, l, r) in zip(crops, boxes):
+            self.assertTrue(np.array_equal(crop, img[u:d, l:r]))
+
+        # grid crops are views
+        c = Cropper(value=0.5)
+        crops = c.multi_crop(img, (2, 3), mode='grid')
+        boxes = c.multi_crop(img, (2, 3), mode='grid', boxes_only=True)
+        self.assertEqual(crops.shape, (2, 3, 213, 320, 3))
+        self.assertTrue(np.shares_memory(crops, img))
+        for crop, (u, d, l, r) in zip(crops.reshape((6,) + crops.shape[2:]), boxes):
+            self.assertTrue(np.array_equal(crop, img[u:d, l:r]))
+        self.assertEqual(c.multi_crop(img, 2, mode='grid').shape[:2], (2, 2))
+
+        with self.assertRaises(ValueError):
+            c.multi_crop(img, 2, (500, 10))
+        with self.assertRaises(ValueError):
+            c.multi_crop(img, 2, mode='???')
+
+        # grids with more crops than positions raise instead of overlapping the border
+        small = np.zeros((10, 12, 3), dtype=np.uint8)
+        for boxes_only in (False, True):
+            with self.assertRaises(ValueError):
+                c.multi_crop(small, 5, (8, 10), mode='grid', boxes_only=boxes_only)
+        crops = c.multi_crop(small, 3, (8, 10), mode='grid')
+        boxes = c.multi_crop(small, 3, (8, 10), mode='grid', boxes_only=True)
+        self.assertEqual(crops.shape, (3, 3, 8, 10, 3))
+        self.assertEqual(boxes[:, 1].max(), 10)
+        self.assertEqual(boxes[:, 3].max(), 12)
+
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork')
+    def test_fork(self):
+        shape = (1000, 1000, 3)
+        c = Cropper('random', 0.4)
+        # generator exists before the fork
+        c.crop_box(shape)
+
+        boxes = forked(lambda: c.crop_box(shape))
+        self.assertEqual(len(set(boxes)), len(boxes))
+
+        # seeded croppers stay reproducible in every worker
+        c = Cropper('random', 0.4, seed=3)
+        boxes = forked(lambda: c.crop_box(shape))
+        self.assertEqual(len(set(boxes)), 1)
+
+
+    def test_seed(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+
+        # equal seeds give equal crops
+        crops = [Cropper('random', 0.4, seed=7).augment(img) for _ in range(2)]
+        self.assertTrue(np.array_equal(crops[0], crops[1]))
+
+        # generators are shared as they are
+        rng = np.random.default_rng(7)
+        c = Cropper('random', 0.4, seed=rng)
+        self.assertIs(c.rng, rng)
+
+
+    def test_seed_pipeline(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        pipeline = [Cropper('random', 0.4), Cropper(), Cropper('random', 0.4)]
+
+        seeding.seed_pipeline(pipeline, seeding.sample_seed_sequence(42, sample_index=3))
+        first = [c.crop_box(img.shape) for c in pipeline]
+        seeding.seed_pipeline(pipeline, seeding.sample_seed_sequence(42, sample_index=3))
+        self.assertEqual(first, [c.crop_box(img.shape) for c in pipeline])
+
+        # augmenters and samples get different streams
+        self.assertNotEqual(first[0], first[2])
+        seeding.seed_pipeline(pipeline, seeding.sample_seed_sequence(42, sample_index=4))
+        self.assertNotEqual(first, [c.crop_box(img.shape) for c in pipeline])
+
+        # streams of different samples, workers and augmenters are independent
+        seed_sequences = [seeding.sample_seed_sequence(42, 3), seeding.sample_seed_sequence(42, 4),
+                          seeding.sample_seed_sequence(42, 3, epoch=1), seeding.worker_seed_sequence(42, 3),
+                          seeding.derive(seeding.sample_seed_sequence(42, 3), 0)]
+        states = [tuple(s.generate_state(4)) for s in seed_sequences]
+        self.assertEqual(len(set(states)), len(states))
+
+
 
 ### RUN
 unittest.main()
\ No newline at end of file
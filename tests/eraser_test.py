@@ -78,5 +78,55 @@ class TestEraser(unittest.TestCase):
         img_result = c.augment(img)
         self.assertEqual(should_shape, img_result.shape)
 
+    def test_seed(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        img_first = Eraser(size=0.05, count=3, seed=1).augment(img.copy())
+        img_second = Eraser(size=0.05, count=3, seed=1).augment(img.copy())
+        self.assertTrue(np.array_equal(img_first, img_second))
+
+        c = Eraser(size=0.05, count=3)
+        c.set_rng(2)
+        self.assertFalse(np.array_equal(img_first, c.augment(img.copy())))
+
+    def test_gauss_fill(self):
+        # blurring a constant image keeps it constant
+        img = np.full((100, 100, 3), 90, dtype=np.uint8)
+        c = Eraser(size=0.05, count=20, fill='gauss', seed=0)
+        self.assertTrue(np.array_equal(c.augment(img.copy()), img))
+
+        # erased areas are smoothed
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        img_result = c.augment(img.copy())
+        self.assertEqual(img_result.shape, img.shape)
+        self.assertEqual(img_result.dtype, img.dtype)
+        changed = np.any(img_result != img, axis=2)
+        self.assertTrue(changed.any())
+        self.assertLess(np.abs(np.diff(img_result.astype(int), axis=1))[changed[:, 1:]].mean(),
+                        np.abs(np.diff(img.astype(int), axis=1))[changed[:, 1:]].mean())
+
+    def test_batch(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        imgs = np.stack([img, img, img])
+        c = Eraser(size=0.01, count=20, color='#ff0000', seed=4)
+
+        imgs_result = c.augment_batch(imgs.copy())
+        self.assertEqual(imgs_result.shape, imgs.shape)
+        erased = np.all(imgs_result == (255, 0, 0), axis=3) & np.any(imgs != (255, 0, 0), axis=3)
+        self.assertTrue(np.all(erased.any(axis=(1, 2))))
+        # images get different rectangles
+        self.assertFalse(np.array_equal(erased[0], erased[1]))
+        # pixels outside of the rectangles are kept
+        self.assertTrue(np.array_equal(imgs_result[~erased], imgs[~erased]))
+
+        # a batch of one equals the single image path
+        img_single = Eraser(size=0.01, count=20, seed=4).augment(img.copy())
+        img_batch = Eraser(size=0.01, count=20, seed=4).augment_batch(img[np.newaxis].copy())[0]
+        self.assertTrue(np.array_equal(img_single, img_batch))
+
+        out = np.empty_like(imgs)
+        self.assertIs(Eraser(fill='gauss').augment_batch(imgs, out=out), out)
+        with self.assertRaises(ValueError):
+            c.augment_batch(img)
+
 ### RUN
 unittest.main()
\ No newline at end of file
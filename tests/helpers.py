@@ -0,0 +1,24 @@
+import os
+import pickle
+
+
+def forked(function, count:int=3) -> list:
+    '''
+    Runs function in count forked child processes and returns their results.
+    '''
+    results = []
+    for _ in range(count):
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(read)
+                with os.fdopen(write, 'wb') as pipe:
+                    pickle.dump(function(), pipe)
+            finally:
+                os._exit(0)
+        os.close(write)
+        with os.fdopen(read, 'rb') as pipe:
+            results.append(pickle.loads(pipe.read()))
+        os.waitpid(pid, 0)
+    return results
@@ -42,6 +42,110 @@ class TestKernelFilter(unittest.TestCase):
         self.assertEqual(img_orig_shape[2], img.shape[2])
 
 
+    def test_kernel_cache(self):
+        ftf = KernelFilter(cache_size=1, engine='fft')
+
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        img_first = ftf.augment(img)
+        img_second = ftf.augment(img)
+        self.assertTrue(np.array_equal(img_first, img_second))
+        self.assertEqual((ftf.cache.hits, ftf.cache.misses), (1, 1))
+
+        # changed parameters need a new kernel
+        ftf.set_value(0.2)
+        ftf.augment(img)
+        self.assertEqual(ftf.cache.misses, 2)
+        self.assertEqual(len(ftf.cache), 1)
+
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_precision(self, mock_stdout):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        img_64 = KernelFilter('gaussian_low_pass', 0.3).augment(img)
+        img_32 = KernelFilter('gaussian_low_pass', 0.3, precision='float32').augment(img)
+
+        self.assertEqual(img_64.shape, img_32.shape)
+        self.assertLessEqual(np.abs(img_64 - img_32).max(), 1)
+
+        ftf = KernelFilter(precision='???')
+        self.assertEqual(ftf.precision, 'float64')
+
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_engines(self, mock_stdout):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))[:128, :192]
+        for method in ['gaussian_high_pass', 'gaussian_low_pass']:
+            img_fft = KernelFilter(method, 0.3, engine='fft').augment(img)
+            img_spatial = KernelFilter(method, 0.3, engine='spatial').augment(img)
+            img_auto = KernelFilter(method, 0.3).augment(img)
+
+            self.assertEqual(img_fft.shape, img_spatial.shape)
+            self.assertLessEqual(np.abs(img_fft - img_spatial).max(), 1)
+            self.assertLessEqual(np.abs(img_fft - img_auto).max(), 1)
+
+        ftf = KernelFilter(engine='???')
+        self.assertEqual(ftf.engine, 'auto')
+
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_padding(self, mock_stdout):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))[:, :637]
+        for padding in ['reflect', 'edge']:
+            ftf = KernelFilter('gaussian_low_pass', 0.3, padding=padding)
+            self.assertEqual(ftf.augment(img).shape, img.shape)
+
+        # cropping removes odd rows and columns
+        img_crop = KernelFilter('gaussian_low_pass', 0.3).augment(img)
+        self.assertEqual(img_crop.shape, (426, 636, 3))
+
+        ftf = KernelFilter(padding='???')
+        self.assertEqual(ftf.padding, 'crop')
+
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_batch(self, mock_stdout):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        imgs = np.stack([img, img[::-1], img[:, ::-1]])
+
+        ftf = KernelFilter('gaussian_low_pass', 0.3)
+        img_result = ftf.augment_batch(imgs)
+        self.assertEqual(img_result.shape, (3, 426, 640, 3))
+        self.assertTrue(np.array_equal(img_result[1], ftf.augment(imgs[1])))
+
+        # threads filter parts of the batch
+        ftf.set_workers(2)
+        self.assertTrue(np.array_equal(ftf.augment_batch(imgs), img_result))
+
+        with self.assertRaises(ValueError):
+            ftf.augment_batch(img)
+
+        ftf.set_workers(0)
+        ftf.set_fft_backend('???')
+        self.assertEqual(ftf.workers, 1)
+        self.assertEqual(ftf.fft_backend, 'numpy')
+
+
+    def test_multi(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        configs = [('gaussian_high_pass', 0.5), ('gaussian_low_pass', 0.2)]
+        ftf = KernelFilter(engine='fft', cache_spectrum=True)
+
+        with unittest.mock.patch('numpy.fft.rfft2', wraps=np.fft.rfft2) as rfft2:
+            img_results = ftf.augment_multi(img, configs)
+            ftf.augment_multi(img.copy(), configs)
+            self.assertEqual(rfft2.call_count, 1)
+
+            # a different image is transformed again
+            ftf.augment_multi(img[::-1], configs)
+            self.assertEqual(rfft2.call_count, 2)
+
+        for (method, value), img_result in zip(configs, img_results):
+            self.assertTrue(np.array_equal(img_result, KernelFilter(method, value, engine='fft').augment(img)))
+
+        with self.assertRaises(ValueError):
+            ftf.augment_multi(img, [('???', 0.5)])
+
+
 
 ### RUN
 unittest.main()
\ No newline at end of file
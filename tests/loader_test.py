@@ -0,0 +1,68 @@
+import unittest
+import unittest.mock
+import io
+import numpy as np
+from PIL import Image
+
+# add folder to path to make relative imports work
+import sys,os
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+from augmentator.loader import Loader
+from augmentator.cropper import Cropper
+
+
+class TestLoader(unittest.TestCase):
+
+    def test_default_values(self):
+        l = Loader()
+        self.assertIsNone(l.cropper)
+        self.assertIsNone(l.target_size)
+        self.assertEqual(l.mode, 'RGB')
+
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_setter(self, mock_stdout):
+        l = Loader(Cropper(), (64, 32), 'L')
+        self.assertEqual(l.target_size, (64, 32))
+        self.assertEqual(l.mode, 'L')
+
+        l.set_target_size((0, 3))
+        l.set_mode('???')
+        self.assertIsNone(l.target_size)
+        self.assertEqual(l.mode, 'RGB')
+
+        with self.assertRaises(ValueError):
+            l.set_cropper('center')
+
+
+    def test_full_resolution(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+
+        self.assertTrue(np.array_equal(Loader().load('tests/images/butterfly.jpg'), img))
+
+        # crop window without resize equals cropping the decoded image
+        img_result = Loader(Cropper()).load('tests/images/butterfly.jpg')
+        self.assertTrue(np.array_equal(img_result, Cropper().augment(img)))
+        self.assertTrue(img_result.flags.writeable)
+
+
+    def test_target_size(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+
+        img_result = Loader(target_size=(100, 150)).load('tests/images/butterfly.jpg')
+        self.assertEqual(img_result.shape, (100, 150, 3))
+        self.assertEqual(img_result.dtype, np.uint8)
+
+        # drafted decode is close to resizing the full image
+        img_full = np.array(Image.fromarray(img).resize((150, 100), Image.BILINEAR))
+        self.assertLess(np.abs(img_result.astype(int) - img_full).mean(), 5)
+
+        # output size of the cropper, gray scale
+        l = Loader(Cropper('random', 0.4, seed=1, output_size=(32, 48)), mode='L')
+        self.assertEqual(l.load('tests/images/butterfly.jpg').shape, (32, 48))
+
+
+
+### RUN
+unittest.main()
@@ -9,6 +9,10 @@ import sys,os
 BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, BASE)
 from augmentator.mixer import Mixer
+from augmentator.mix_bank import MixBank
+import tempfile
+import pickle
+import tracemalloc
 
 class TestMixer(unittest.TestCase):
 
@@ -16,9 +20,12 @@ class TestMixer(unittest.TestCase):
 
     @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
     def test_default_without_mix_img(self, mock_stdout):
-        # must raise error
+        c = Mixer()
+        self.assertIsNone(c.mix_img)
+
+        # augment must raise error without mixing partner
         with self.assertRaises(ValueError):
-            c = Mixer()
+            c.augment(np.zeros((4, 4, 3), dtype=np.uint8))
 
     @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
     def test_default_values(self, mock_stdout, test_img_dir=TEST_IMG_DIR):
@@ -100,5 +107,184 @@ class TestMixer(unittest.TestCase):
         img_result = c.augment(img_2)
         self.assertEqual(should_shape, img_result.shape)
 
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_padding(self, mock_stdout, test_img_dir=TEST_IMG_DIR):
+        img_1 = np.array(Image.open(f'{test_img_dir}butterfly.jpg'))
+        img_2 = np.array(Image.open(f'{test_img_dir}flower.jpg'))[:301, :500]
+        c = Mixer(method='avg', mix_img=img_1)
+
+        img_result = c.augment(img_2)
+        # mix_img is left untouched, padded version is cached
+        self.assertEqual(c.mix_img.shape, img_1.shape)
+        self.assertEqual(c.mix_img.dtype, np.uint8)
+        self.assertEqual(len(c.cache), 1)
+
+        # padded areas are mixed with white, sums do not overflow
+        expected = (img_1[0, 0].astype(int) + 255) // 2
+        self.assertTrue(np.array_equal(img_result[0, 0], expected))
+        expected = (img_1[63, 70].astype(int) + img_2[0, 0]) // 2
+        self.assertTrue(np.array_equal(img_result[63, 70], expected))
+
+        # smaller mix_img is padded
+        c = Mixer(method='rel', value=0.2, mix_img=img_2)
+        img_result = c.augment(img_1)
+        self.assertEqual(img_result.shape, img_1.shape)
+        expected = (img_1[0, 0] * 0.2 + 255 * 0.8).astype(int)
+        self.assertTrue(np.array_equal(img_result[0, 0], expected))
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_mix_bank(self, mock_stdout, test_img_dir=TEST_IMG_DIR):
+        img_1 = np.array(Image.open(f'{test_img_dir}butterfly.jpg'))
+        img_2 = np.array(Image.open(f'{test_img_dir}flower.jpg'))[:300, :500]
+
+        with tempfile.TemporaryDirectory() as bank_folder:
+            bank = MixBank.create(bank_folder, [img_1, img_2])
+            self.assertEqual(len(bank), 2)
+            self.assertTrue(np.array_equal(bank[1], img_2))
+            self.assertIsInstance(bank.data, np.memmap)
+
+            # workers reopen the memory map
+            bank_copy = pickle.loads(pickle.dumps(bank))
+            self.assertTrue(np.array_equal(bank_copy[0], img_1))
+
+            c = Mixer(method='avg', mix_bank=bank)
+            self.assertIsNone(c.mix_img)
+            img_result = c.augment(img_1, index=0)
+            self.assertTrue(np.array_equal(img_result, img_1))
+            img_result = c.augment(img_2)
+            self.assertEqual(img_result.shape[2], 3)
+
+            del bank, bank_copy, c
+
+        # empty banks are rejected instead of mapping an empty file
+        with tempfile.TemporaryDirectory() as bank_folder:
+            with self.assertRaises(ValueError):
+                MixBank.create(bank_folder, [])
+            self.assertFalse(os.path.exists(os.path.join(bank_folder, 'data.bin')))
+            open(os.path.join(bank_folder, 'data.bin'), 'wb').close()
+            np.save(os.path.join(bank_folder, 'index.npy'), np.zeros((0, 4), dtype=np.int64))
+            with self.assertRaises(ValueError):
+                MixBank(bank_folder)
+
+        with self.assertRaises(ValueError):
+            Mixer(mix_bank='invalid type')
+
+        # drawing from a bank requires one
+        c = Mixer(mix_img=img_1)
+        with self.assertRaises(ValueError):
+            c.augment(img_1, index=0)
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_fixed_blending(self, mock_stdout, test_img_dir=TEST_IMG_DIR):
+        img_1 = np.array(Image.open(f'{test_img_dir}butterfly.jpg'))
+        img_2 = np.array(Image.open(f'{test_img_dir}flower.jpg'))[:300, :500]
+
+        for method, value in [('avg', 0.5), ('rel', 0.3)]:
+            c_float = Mixer(method=method, value=value, mix_img=img_2)
+            c_fixed = Mixer(method=method, value=value, mix_img=img_2, blending='fixed')
+            self.assertEqual(c_fixed.blending, 'fixed')
+
+            out = np.zeros(img_1.shape, dtype=np.uint8)
+            img_result = c_fixed.augment(img_1, out=out)
+            self.assertIs(img_result, out)
+            self.assertLessEqual(np.abs(c_float.augment(img_1) - img_result).max(), 1)
+
+        # saturated values stay in range
+        white = np.full((2, 2, 3), 255, dtype=np.uint8)
+        c = Mixer(method='rel', value=0.7, mix_img=white, blending='fixed')
+        self.assertTrue(np.all(c.augment(white) == 255))
+
+        with self.assertRaises(ValueError):
+            c.augment(white.astype(np.float64))
+
+        c.set_blending('???')
+        self.assertEqual(c.blending, 'float')
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_batch(self, mock_stdout, test_img_dir=TEST_IMG_DIR):
+        img_1 = np.array(Image.open(f'{test_img_dir}butterfly.jpg'))
+        img_2 = np.array(Image.open(f'{test_img_dir}flower.jpg'))
+        imgs = np.stack([img_1, img_2, img_1[::-1]])
+
+        # no mixing partner needed
+        c = Mixer(method='rel', value=0.3)
+        img_result, permutation, weights = c.augment_batch(imgs, permutation=np.array([1, 2, 0]))
+        self.assertEqual(img_result.shape, imgs.shape)
+        self.assertTrue(np.all(weights == 0.3))
+        c.set_mix_img(img_2)
+        self.assertTrue(np.array_equal(img_result[0], c.augment(img_1)))
+
+        # random partners with per-sample weights
+        c.set_blending('fixed')
+        img_result, permutation, weights = c.augment_batch(imgs, alpha=0.4)
+        self.assertEqual(img_result.dtype, np.uint8)
+        self.assertEqual(sorted(permutation), [0, 1, 2])
+        self.assertTrue(np.all((0 <= weights) & (weights <= 1)))
+        expected = imgs[0] * weights[0] + imgs[permutation[0]] * (1 - weights[0])
+        self.assertLessEqual(np.abs(img_result[0] - expected).max(), 1)
+
+        with self.assertRaises(ValueError):
+            c.augment_batch(img_1)
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_seed(self, mock_stdout, test_img_dir=TEST_IMG_DIR):
+        img_1 = np.array(Image.open(f'{test_img_dir}butterfly.jpg'))
+        img_2 = np.array(Image.open(f'{test_img_dir}flower.jpg'))
+        imgs = np.stack([img_1, img_2, img_1[::-1], img_2[::-1]])
+
+        results = [Mixer(method='rel', value=0.3, seed=5).augment_batch(imgs, alpha=0.4) for _ in range(2)]
+        for first, second in zip(*results):
+            self.assertTrue(np.array_equal(first, second))
+
+        c = Mixer(method='rel', value=0.3)
+        c.set_rng(6)
+        _, permutation, weights = c.augment_batch(imgs, alpha=0.4)
+        self.assertFalse(np.array_equal(weights, results[0][2]))
+
+        # unpickled copies of unseeded mixers draw their own partners
+        c = Mixer(method='rel', value=0.3)
+        c.augment_batch(imgs)
+        copies = [pickle.loads(pickle.dumps(c)) for _ in range(2)]
+        self.assertFalse(np.array_equal(copies[0].rng.random(8), copies[1].rng.random(8)))
+
+        # random partners from the bank
+        with tempfile.TemporaryDirectory() as bank_folder:
+            bank = MixBank.create(bank_folder, [img_2, img_1, img_2[::-1], img_1[::-1]])
+            img_first = Mixer(mix_bank=bank, seed=7).augment(img_1)
+            img_second = Mixer(mix_bank=bank, seed=7).augment(img_1)
+            self.assertTrue(np.array_equal(img_first, img_second))
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_memory(self, mock_stdout):
+        img = np.full((1024, 512, 3), 100, dtype=np.uint8)
+        for method, blending in [('avg', 'float'), ('rel', 'float'), ('rel', 'fixed')]:
+            c = Mixer(method=method, value=0.3, mix_img=img[:800], blending=blending)
+            out = c.augment(img)
+
+            # no image sized temporaries besides the output
+            tracemalloc.start()
+            c.augment(img, out=out)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.assertLess(peak, img.nbytes)
+
+            # temporaries do not grow with the image
+            small = img[:256, :256]
+            out = c.augment(small)
+            tracemalloc.start()
+            c.augment(small, out=out)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.assertLess(peak, small.nbytes)
+
+            # batches mix in blocks and gather partners per block
+            imgs = np.full((8, 224, 224, 3), 100, dtype=np.uint8)
+            out = c.augment_batch(imgs)[0]
+            tracemalloc.start()
+            c.augment_batch(imgs, alpha=0.4, out=out)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.assertLess(peak, imgs.nbytes // 4)
+
 ### RUN
 unittest.main()
\ No newline at end of file
@@ -9,6 +9,7 @@ import sys,os
 BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, BASE)
 from augmentator.noise_injector import Noise_Injector
+from helpers import forked
 
 
 class TestNoiseInjector(unittest.TestCase):
@@ -41,6 +42,91 @@ class TestNoiseInjector(unittest.TestCase):
         self.assertEqual(img_orig_shape, img.shape)
 
 
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_float32_engine(self, mock_stdout):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+
+        ni = Noise_Injector(value=1.0, precision='float32', bit_generator='Philox')
+        img_result = ni.augment(img)
+        self.assertEqual(img_result.shape, img.shape)
+        self.assertEqual(img_result.dtype, np.uint8)
+        # noise with mean 30 and sigma 20
+        diff = img_result.astype(np.float64) - img
+        self.assertAlmostEqual(diff[img < 150].mean(), 29.5, delta=1)
+
+        # noise texture
+        ni.set_texture_size(64)
+        out = np.empty_like(img)
+        self.assertIs(ni.augment(img, out=out), out)
+        diff = out.astype(np.float64) - img
+        self.assertAlmostEqual(diff[img < 150].std(), 20, delta=2)
+
+        ni.set_precision('???')
+        ni.set_bit_generator('???')
+        ni.set_texture_size(-1)
+        self.assertEqual((ni.precision, ni.bit_generator, ni.texture_size), ('float64', 'PCG64', 0))
+        self.assertEqual(ni.augment(img).dtype, np.int32)
+
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_salt_pepper(self, mock_stdout):
+        img = np.full((60, 40, 3), 128, dtype=np.uint8)
+        ni = Noise_Injector('salt_pepper', 1.0, seed=3, inplace=False)
+        num_salt = np.ceil(0.01 * img.size * 0.5)
+
+        # unique pixels, last row and column can be hit
+        img_result = ni.augment(img)
+        self.assertTrue(np.all(img == 128))
+        self.assertEqual((img_result[:, :, 0] == 255).sum(), num_salt)
+        self.assertEqual((img_result[:, :, 0] == 0).sum(), num_salt)
+        hits = np.zeros((60, 40), dtype=bool)
+        for _ in range(50):
+            hits |= ni.augment(img)[:, :, 0] != 128
+        self.assertTrue(hits[-1].any() and hits[:, -1].any())
+
+        # batch
+        imgs = np.stack([img, img, img])
+        imgs_result = ni.augment_batch(imgs)
+        self.assertEqual(imgs_result.shape, imgs.shape)
+        self.assertTrue(np.all((imgs_result[:, :, :, 0] == 255).sum(axis=(1, 2)) == num_salt))
+        self.assertFalse(np.array_equal(imgs_result[0], imgs_result[1]))
+
+        # bernoulli mask and in place policy
+        ni.set_sampling('bernoulli')
+        ni.set_inplace(True)
+        self.assertIs(ni.augment_batch(imgs), imgs)
+        self.assertTrue(np.any(imgs != 128))
+
+        ni.set_sampling('???')
+        self.assertEqual(ni.sampling, 'unique')
+        with self.assertRaises(ValueError):
+            ni.augment_batch(img)
+
+
+
+    def test_seed(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        for kwargs in [{}, {'precision': 'float32'}, {'precision': 'float32', 'texture_size': 64}, {'method': 'salt_pepper', 'value': 1.0}]:
+            img_first = Noise_Injector(seed=11, **kwargs).augment(img.copy())
+            img_second = Noise_Injector(seed=11, **kwargs).augment(img.copy())
+            self.assertTrue(np.array_equal(img_first, img_second))
+
+            ni = Noise_Injector(**kwargs)
+            ni.set_rng(12)
+            self.assertFalse(np.array_equal(img_first, ni.augment(img.copy())))
+
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork')
+    def test_fork(self):
+        img = np.full((32, 32, 3), 100, dtype=np.uint8)
+        for kwargs in [{}, {'precision': 'float32'}]:
+            ni = Noise_Injector(**kwargs)
+            # generator exists before the fork
+            ni.augment(img)
+
+            noises = forked(lambda: ni.augment(img).tobytes())
+            self.assertEqual(len(set(noises)), len(noises))
+
 
 ### RUN
 unittest.main()
\ No newline at end of file
@@ -8,10 +8,165 @@ from PIL import Image
 import sys,os
 BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, BASE)
-from augmentator.mixer import Mixer
+from augmentator.rotator import Rotator
+
+class TestRotator(unittest.TestCase):
+
+    def test_default_values(self):
+        r = Rotator()
+        self.assertEqual(r.method, 'center')
+        self.assertEqual(r.angle, 90)
+        self.assertTrue(r.anti_aliasing)
+        self.assertEqual(r.interpolation, 'bilinear')
+
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_setter(self, mock_stdout):
+        r = Rotator('point', 45, (20, 80), anti_aliasing=True)
+        self.assertEqual(r.method, 'point')
+        self.assertEqual(r.angle, 45)
+        self.assertEqual((r.pivot_point_x, r.pivot_point_y), (20, 80))
+        self.assertTrue(r.anti_aliasing)
+
+        r.set_method('???')
+        r.set_angle(400)
+        r.set_anti_aliasing(False)
+        self.assertEqual(r.method, 'center')
+        self.assertEqual(r.angle, 90)
+        self.assertEqual(r.interpolation, 'nearest')
+
+
+    def test_image_dims(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+
+        r = Rotator(angle=30)
+        img_result = r.augment(img)
+        self.assertGreater(img_result.shape[0], img.shape[0])
+        self.assertEqual(img_result.shape[2], img.shape[2])
+        self.assertEqual(img_result.dtype, img.dtype)
+
+        r = Rotator(angle=30, anti_aliasing=False)
+        self.assertEqual(r.augment(img).shape, img.shape)
+
+
+    def test_rotation_direction(self):
+        # pixel right of the center ends up below the center
+        img = np.zeros((5, 7, 3), dtype=np.uint8)
+        img[2, 4] = 100
+        r = Rotator(angle=90, anti_aliasing=False)
+        img_result = r.augment(img)
+
+        self.assertEqual(img_result[3, 3, 0], 100)
+        self.assertEqual(img_result[2, 4, 0], 0)
+        # pixels rotated in from outside are white
+        self.assertEqual(img_result[0, 0, 0], 255)
+
+
+    def test_point_rotation(self):
+        img = np.zeros((10, 10, 3), dtype=np.uint8)
+        img[0, 5] = 100
+        r = Rotator('point', 90, (0, 0), anti_aliasing=False)
+        img_result = r.augment(img)
+
+        self.assertEqual(img_result[5, 0, 0], 100)
+
+
+    def test_cache(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        r = Rotator(angle=30, cache_size=2)
+
+        img_first = r.augment(img)
+        img_second = r.augment(img)
+        self.assertTrue(np.array_equal(img_first, img_second))
+        self.assertEqual((r.cache.hits, r.cache.misses), (1, 1))
+
+        # lru entry is evicted
+        r.set_angle(40)
+        r.augment(img)
+        r.set_angle(50)
+        r.augment(img)
+        self.assertEqual(len(r.cache), 2)
+        r.set_angle(30)
+        r.augment(img)
+        self.assertEqual(r.cache.misses, 4)
+
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_index_dtype(self, mock_stdout):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        img_int32 = Rotator(angle=30, index_dtype='int32').augment(img)
+        img_int16 = Rotator(angle=30, index_dtype='int16').augment(img)
+        self.assertTrue(np.array_equal(img_int32, img_int16))
+
+        r = Rotator(index_dtype='???')
+        self.assertEqual(r.index_dtype, 'int32')
+
+
+    def test_batch(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        imgs = np.stack([img, img[::-1], img])
+        r = Rotator(angle=30, anti_aliasing=False)
+
+        # same size canvas, shared angle
+        img_result = r.augment_batch(imgs)
+        self.assertEqual(img_result.shape, imgs.shape)
+        self.assertTrue(np.array_equal(img_result[0], r.augment(img)))
+
+        # expanded canvas, per-sample angles, preallocated output
+        img_result = r.augment_batch(imgs, angles=[30, 45, 30], canvas='expand', fill_value=0)
+        self.assertGreater(img_result.shape[1], img.shape[0])
+        self.assertTrue(np.array_equal(img_result[0], img_result[2]))
+        self.assertEqual(img_result[1, 0, 0, 0], 0)
+
+        out = np.zeros(img_result.shape, dtype=np.uint8)
+        self.assertIs(r.augment_batch(imgs, angles=[30, 45, 30], canvas='expand', fill_value=0, out=out), out)
+        self.assertTrue(np.array_equal(out, img_result))
+
+        # every image equals its own rotation, more angles than cached maps leave the cache alone
+        r = Rotator(anti_aliasing=True, cache_size=2)
+        angles = [10, 20, 10, 30]
+        img_result = r.augment_batch(imgs[[0, 1, 2, 0]], angles=angles)
+        self.assertEqual((r.cache.hits, r.cache.misses), (0, 0))
+        for i, angle in enumerate(angles):
+            expected = r.augment_batch(imgs[[0, 1, 2, 0]][i:i + 1], angles=angle)[0]
+            self.assertTrue(np.array_equal(img_result[i], expected))
+
+        with self.assertRaises(ValueError):
+            r.augment_batch(img)
+
+
+    def test_right_angles(self):
+        img = np.array(Image.open('tests/images/butterfly.jpg'))
+        r = Rotator(angle=90)
+
+        img_result = r.augment(img)
+        self.assertTrue(r.is_view)
+        self.assertEqual(img_result.shape, (img.shape[1], img.shape[0], 3))
+        self.assertTrue(np.shares_memory(img_result, img))
+        self.assertTrue(np.array_equal(img_result[0, :, 0], img[::-1, 0, 0]))
+
+        for angle in [0, 180, 360]:
+            r.set_angle(angle)
+            self.assertEqual(r.augment(img).shape, img.shape)
+            self.assertTrue(r.is_view)
+
+        # not a view in general
+        r.set_angle(45)
+        r.augment(img)
+        self.assertFalse(r.is_view)
+
+        # batch
+        imgs = np.stack([img, img])
+        r.set_angle(270)
+        img_result = r.augment_batch(imgs, canvas='expand')
+        self.assertTrue(r.is_view)
+        self.assertEqual(img_result.shape, (2, img.shape[1], img.shape[0], 3))
+        out = np.empty_like(imgs)
+        r.augment_batch(imgs, angles=180, out=out)
+        self.assertFalse(r.is_view)
+        self.assertTrue(np.array_equal(out[1], img[::-1, ::-1]))
+
 
-class TestMixer(unittest.TestCase):
-    pass
 
 ### RUN
-unittest.main()
\ No newline at end of file
+unittest.main()